@@ -19,9 +19,11 @@ s = (
     "version = '{version}'\n").format(version=version)
 install_requires = [
     'networkx >= 2.0',
-    'PyPDF2 >= 1.26.0',  # `tlapy.utils.join_modules`
-    'tla >= 0.0.1',  # `tlapy.proof_graph`
+    'PyPDF2 >= 3.0.0',  # `tlapy.utils.join_modules`
     ]
+extras_require = dict(
+    proof_graph=['tla >= 0.0.4'],  # `tlapy.proof_graph`
+    )
 tests_require = ['nose']
 classifiers = [
     'Development Status :: 2 - Pre-Alpha',
@@ -60,8 +62,9 @@ def run_setup():
         url=url,
         license='BSD',
         install_requires=install_requires,
+        extras_require=extras_require,
         tests_require=tests_require,
-        packages=[name],
+        packages=[name, name + '.utils'],
         package_dir={name: name},
         classifiers=classifiers,
         keywords=keywords)
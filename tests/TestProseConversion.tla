@@ -0,0 +1,6 @@
+Prose with `code` and `more`.
+
+------------------ MODULE TestProseConversion ------------------
+x == "`a`" \* `b` and `c`
+================================================================
+After the module, `d` and `e`.
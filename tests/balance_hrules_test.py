@@ -0,0 +1,59 @@
+"""Tests of `tlapy.utils.balance_hrules`."""
+import os
+import tempfile
+
+from tlapy.utils import balance_hrules as bh
+
+
+SPEC = (
+    '---- MODULE A ----\n'
+    'x == 1\n'
+    '----\n'
+    '(* ---- *)\n'
+    '====\n')
+
+
+def _write(fname, s):
+    with open(fname, 'w') as f:
+        f.write(s)
+
+
+def _read(fname):
+    with open(fname, 'r') as f:
+        return f.read()
+
+
+def test_main():
+    with tempfile.TemporaryDirectory() as d:
+        fname = os.path.join(d, 'A.tla')
+        _write(fname, SPEC)
+        assert bh.main(fname, fname, 20)
+        assert _read(fname) == (
+            '----- MODULE A -----\n'
+            'x == 1\n'
+            '--------------------\n'
+            '(* ---- *)\n'
+            '====================\n'), _read(fname)
+        # balanced already: the file is not written
+        mtime = os.stat(fname).st_mtime_ns
+        assert not bh.main(fname, fname, 20)
+        assert os.stat(fname).st_mtime_ns == mtime
+
+
+def test_balance_tree():
+    with tempfile.TemporaryDirectory() as d:
+        os.makedirs(os.path.join(d, 'sub'))
+        a = os.path.join(d, 'A.tla')
+        b = os.path.join(d, 'sub', 'B.tla')
+        bad = os.path.join(d, 'C.tla')
+        _write(a, SPEC)
+        _write(b, SPEC.replace('A', 'B'))
+        _write(os.path.join(d, 'notes.txt'), '----\n')
+        # a missing file
+        report = bh.balance_tree([d, bad], 20, jobs=2)
+        assert report['changed'] == [a, b], report
+        assert list(report['failed']) == [bad], report
+        mtimes = [os.stat(f).st_mtime_ns for f in (a, b)]
+        report = bh.balance_tree([d], 20, jobs=2)
+        assert report == dict(changed=list(), failed=dict()), report
+        assert [os.stat(f).st_mtime_ns for f in (a, b)] == mtimes
@@ -0,0 +1,75 @@
+"""Tests of `tlapy.file_io`."""
+import argparse
+import hashlib
+import os
+import tempfile
+
+from tlapy import file_io
+
+
+def test_jobs_argument():
+    p = argparse.ArgumentParser()
+    file_io.add_jobs_argument(p, 'number of files')
+    assert p.parse_args([]).jobs == 1
+    assert p.parse_args(['-j', '3']).jobs == 3
+    assert p.parse_args(['-j']).jobs == os.cpu_count()
+    try:
+        p.parse_args(['-j', '0'])
+    except SystemExit:
+        pass
+    else:
+        raise AssertionError('`-j 0` accepted')
+
+
+def test_atomic_open():
+    with tempfile.TemporaryDirectory() as d:
+        fname = os.path.join(d, 'a.txt')
+        file_io.write_file(fname, 'old')
+        try:
+            with file_io.atomic_open(fname) as f:
+                f.write('new')
+                raise RuntimeError()
+        except RuntimeError:
+            pass
+        assert _read(fname) == 'old'
+        assert os.listdir(d) == ['a.txt'], os.listdir(d)
+        file_io.write_file(fname, 'new', file_mode=0o600)
+        assert _read(fname) == 'new'
+        assert os.stat(fname).st_mode & 0o777 == 0o600
+
+
+def test_json():
+    with tempfile.TemporaryDirectory() as d:
+        fname = os.path.join(d, 'cache', 'a.json')
+        assert file_io.load_json(fname) is None
+        file_io.dump_json(fname, dict(a=1))
+        assert file_io.load_json(fname) == dict(a=1)
+        file_io.write_file(fname, '{')
+        assert file_io.load_json(fname) is None
+
+
+def test_file_digest():
+    with tempfile.TemporaryDirectory() as d:
+        fname = os.path.join(d, 'a.txt')
+        file_io.write_file(fname, 'abc')
+        expected = hashlib.sha256(b'abc').hexdigest()
+        assert file_io.file_digest(fname) == expected
+
+
+
+def test_tree_files():
+    with tempfile.TemporaryDirectory() as d:
+        for name in ('b/B.tla', 'a/A.tla', 'a/notes.txt', 'C.tla'):
+            fname = os.path.join(d, name)
+            os.makedirs(os.path.dirname(fname), exist_ok=True)
+            file_io.write_file(fname, '')
+        other = os.path.join(d, 'a', 'notes.txt')
+        files = list(file_io.tree_files([other, d]))
+        expected = [other] + [
+            os.path.join(d, name)
+            for name in ('C.tla', 'a/A.tla', 'b/B.tla')]
+        assert files == expected, files
+
+def _read(fname):
+    with open(fname, 'r') as f:
+        return f.read()
@@ -0,0 +1,144 @@
+"""Tests of `tlapy.graph_io`, using a stub of `dot`."""
+import contextlib
+import json
+import os
+import subprocess
+import sys
+import tempfile
+from xml.etree import ElementTree
+
+import networkx as nx
+
+from tlapy import graph_io
+from tlapy import proof_graph
+
+
+# stand-in for `dot`: writes the format and its input
+# to standard output, and fails if the input says `FAIL`
+STUB_DOT = r'''#!{python}
+import sys
+
+s = sys.stdin.read()
+if 'FAIL' in s:
+    sys.exit(1)
+sys.stdout.write(sys.argv[1] + '\n' + s)
+'''
+GRAPHML = '{http://graphml.graphdrawing.org/xmlns}'
+
+
+@contextlib.contextmanager
+def _workdir():
+    """Yield temporary directory with a stub `dot` in `PATH`.
+
+    The directory is the current directory while in the context.
+    """
+    cwd = os.getcwd()
+    path = os.environ['PATH']
+    with tempfile.TemporaryDirectory() as d:
+        os.chdir(d)
+        try:
+            os.makedirs('bin')
+            stub = os.path.join(d, 'bin', graph_io.DOT)
+            with open(stub, 'w') as f:
+                f.write(STUB_DOT.format(python=sys.executable))
+            os.chmod(stub, 0o755)
+            os.environ['PATH'] = os.path.join(d, 'bin') + os.pathsep + path
+            yield d
+        finally:
+            os.environ['PATH'] = path
+            os.chdir(cwd)
+
+
+def _graphs():
+    """Return equal `networkx` and compact graphs."""
+    h = proof_graph.CompactProofGraph()
+    h.module_name = 'M'
+    h.add_node('Thm', kind='theorem', label='a "b"', proof=None)
+    h.add_node(1, kind='step')
+    h.add_edge('Thm', 1)
+    h.add_edge(1, 'Fact')
+    g = nx.DiGraph()
+    g.module_name = 'M'
+    g.add_node('Thm', kind='theorem', label='a "b"', proof=None)
+    g.add_node(1, kind='step')
+    g.add_edge('Thm', 1)
+    g.add_edge(1, 'Fact')
+    return g, h
+
+
+def _read(fname):
+    with open(fname, 'r') as f:
+        return f.read()
+
+
+def test_write_dot():
+    for g in _graphs():
+        with _workdir():
+            graph_io.dump_graph(g, 'g.dot')
+            assert _read('g.dot') == (
+                'strict digraph "M" {\n'
+                '"Thm" ["kind"="theorem", "label"="a \\"b\\""];\n'
+                '"1" ["kind"="step"];\n'
+                '"Fact";\n'
+                '"Thm" -> "1";\n'
+                '"1" -> "Fact";\n'
+                '}\n'), _read('g.dot')
+
+
+def test_write_graphml():
+    for g in _graphs():
+        with _workdir():
+            graph_io.dump_graph(g, 'g.graphml')
+            root = ElementTree.parse('g.graphml').getroot()
+            graph = root.find(GRAPHML + 'graph')
+            assert graph.get('id') == 'M'
+            nodes = graph.findall(GRAPHML + 'node')
+            assert [u.get('id') for u in nodes] == ['Thm', '1', 'Fact']
+            data = {
+                d.get('key'): d.text
+                for d in nodes[0].findall(GRAPHML + 'data')}
+            assert data == dict(nkind='theorem', nlabel='a "b"'), data
+            edges = [
+                (e.get('source'), e.get('target'))
+                for e in graph.findall(GRAPHML + 'edge')]
+            assert edges == [('Thm', '1'), ('1', 'Fact')], edges
+
+
+def test_write_jsonl():
+    for g in _graphs():
+        with _workdir():
+            graph_io.dump_graph(g, 'g.jsonl')
+            lines = [
+                json.loads(line)
+                for line in _read('g.jsonl').splitlines()]
+            assert lines[0] == dict(graph='M')
+            assert [x.get('node') for x in lines[1:4]] == ['Thm', 1, 'Fact']
+            assert [x['edge'] for x in lines[4:]] == [['Thm', 1], [1, 'Fact']]
+
+
+def test_unknown_format():
+    g, _ = _graphs()
+    try:
+        graph_io.dump_graph(g, 'g.txt')
+    except ValueError:
+        pass
+    else:
+        raise AssertionError('unknown format not reported')
+
+
+def test_render():
+    g, h = _graphs()
+    with _workdir():
+        graph_io.dump_graph(h, 'g.svg')
+        s = _read('g.svg')
+        assert s.startswith('-Tsvg\nstrict digraph "M" {\n'), s
+        # a failure leaves the file unchanged
+        g.add_node('FAIL')
+        try:
+            graph_io.dump_graph(g, 'g.svg')
+        except subprocess.CalledProcessError:
+            pass
+        else:
+            raise AssertionError('failure not reported')
+        assert _read('g.svg') == s
+        assert sorted(os.listdir('.')) == ['bin', 'g.svg'], os.listdir('.')
@@ -0,0 +1,137 @@
+"""Tests of `tlapy.utils.join_modules`, using a stub of `xelatex`."""
+import contextlib
+import os
+import sys
+import tempfile
+
+from PyPDF2 import PdfReader
+from PyPDF2 import PdfWriter
+
+from tlapy.utils import join_modules
+
+
+# stand-in for `xelatex`: writes a PDF file with one blank page,
+# and records its call
+STUB_XELATEX = r'''#!{python}
+import os
+import sys
+
+from PyPDF2 import PdfWriter
+
+fname = sys.argv[-1]
+with open({calls!r}, 'a') as f:
+    f.write(fname + '\n')
+base, _ = os.path.splitext(fname)
+w = PdfWriter()
+w.add_blank_page(72, 72)
+with open(base + '.pdf', 'wb') as f:
+    w.write(f)
+'''
+
+
+@contextlib.contextmanager
+def _workdir():
+    """Yield temporary directory with a stub `xelatex` in `PATH`.
+
+    The directory is the current directory while in the context.
+    """
+    cwd = os.getcwd()
+    path = os.environ['PATH']
+    with tempfile.TemporaryDirectory() as d:
+        os.chdir(d)
+        try:
+            os.makedirs('bin')
+            stub = os.path.join(d, 'bin', 'xelatex')
+            with open(stub, 'w') as f:
+                f.write(STUB_XELATEX.format(
+                    python=sys.executable,
+                    calls=os.path.join(d, 'calls')))
+            os.chmod(stub, 0o755)
+            os.environ['PATH'] = os.path.join(d, 'bin') + os.pathsep + path
+            yield d
+        finally:
+            os.environ['PATH'] = path
+            os.chdir(cwd)
+
+
+def _write_pdf(fname, pages):
+    """Write PDF file `fname` with `pages` blank pages."""
+    head, _ = os.path.split(fname)
+    if head:
+        os.makedirs(head, exist_ok=True)
+    w = PdfWriter()
+    for _ in range(pages):
+        w.add_blank_page(72, 72)
+    with open(fname, 'wb') as f:
+        w.write(f)
+
+
+def _calls():
+    """Return number of calls of the stub `xelatex`."""
+    if not os.path.isfile('calls'):
+        return 0
+    with open('calls', 'r') as f:
+        return len(f.read().splitlines())
+
+
+def _outline(fname):
+    """Return bookmark titles and page numbers of PDF file `fname`."""
+    pdf = PdfReader(fname)
+    return [
+        (item.title, pdf.get_destination_page_number(item))
+        for item in pdf.outline]
+
+
+def test_merge_without_latex():
+    with _workdir():
+        _write_pdf('A.pdf', 2)
+        _write_pdf('sub/B.pdf', 1)
+        join_modules.join_modules(['A.pdf', 'sub/B.pdf'])
+        fname = join_modules.MERGED_FILE
+        # front matter, then the modules
+        assert len(PdfReader(fname).pages) == 4
+        assert _outline(fname) == [('A', 1), ('B', 3)], _outline(fname)
+        assert _calls() == 1, _calls()
+
+
+def test_merge_with_latex():
+    with _workdir():
+        _write_pdf('x/A.pdf', 2)
+        _write_pdf('y/A.pdf', 1)
+        join_modules.join_modules(['x/A.pdf', 'y/A.pdf'], latex=True)
+        assert os.path.isfile(join_modules.MERGED_FILE)
+        names = [
+            name for name in os.listdir(join_modules.AUXDIR)
+            if name.endswith('_A.pdf')]
+        # copies of files in different directories do not collide
+        assert len(names) == 2, names
+
+
+def test_manifest_skips_unchanged_merge():
+    with _workdir():
+        _write_pdf('A.pdf', 2)
+        _write_pdf('B.pdf', 1)
+        paths = ['A.pdf', 'B.pdf']
+        fname = join_modules.MERGED_FILE
+        join_modules.join_modules(paths)
+        assert _calls() == 1, _calls()
+        st = os.stat(fname)
+        # nothing changed: the merged file is not written
+        join_modules.join_modules(paths)
+        assert os.stat(fname).st_mtime_ns == st.st_mtime_ns
+        assert _calls() == 1, _calls()
+        # a changed module: merged again, without typesetting
+        _write_pdf('B.pdf', 3)
+        join_modules.join_modules(paths)
+        assert len(PdfReader(fname).pages) == 6
+        assert _calls() == 1, _calls()
+        # a changed license: the front matter is typeset again
+        with open(join_modules.LICENSE, 'w') as f:
+            f.write('License\n')
+        join_modules.join_modules(paths)
+        assert _calls() == 2, _calls()
+        # a removed merged file is written again
+        os.remove(fname)
+        join_modules.join_modules(paths)
+        assert os.path.isfile(fname)
+        assert _calls() == 2, _calls()
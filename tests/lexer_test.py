@@ -0,0 +1,112 @@
+"""Tests of `tlapy.lexer`."""
+import os
+import tempfile
+
+from tlapy import lexer
+
+
+def _kinds(lines, prose=False):
+    return [
+        (tok.kind, tok.text)
+        for tok in lexer.tokenize(lines, prose)]
+
+
+def test_tokens():
+    lines = [
+        '---- MODULE Foo ----\n',
+        'EXTENDS Naturals\n',
+        'x == <<1, "a">> \\* comment\n',
+        '-----\n',
+        '====\n']
+    assert _kinds(lines) == [
+        ('module', '---- MODULE Foo ----'),
+        ('word', 'EXTENDS'), ('word', 'Naturals'),
+        ('word', 'x'), ('symbol', '=='), ('symbol', '<<'),
+        ('word', '1'), ('symbol', ','), ('string', '"a"'),
+        ('symbol', '>>'), ('comment', '\\* comment'),
+        ('rule', '-----'),
+        ('rule', '====')]
+
+
+def test_positions():
+    tokens = list(lexer.tokenize(['x == 1\n', '  <1>2. y\n']))
+    assert [(t.line, t.column) for t in tokens] == [
+        (1, 0), (1, 2), (1, 5), (2, 2), (2, 8)]
+
+
+def test_nested_comments():
+    lines = [
+        'a (* b (* c *)\n',
+        'd *) e\n',
+        '(* f *) g\n']
+    assert _kinds(lines) == [
+        ('word', 'a'), ('comment', '(* b (* c *)'),
+        ('comment', 'd *)'), ('word', 'e'),
+        ('comment', '(* f *)'), ('word', 'g')]
+
+
+def test_strings():
+    lines = ['x == "(* \\" \\\\*" y\n']
+    assert _kinds(lines) == [
+        ('word', 'x'), ('symbol', '=='),
+        ('string', '"(* \\" \\\\*"'), ('word', 'y')]
+
+
+def test_steps():
+    lines = ['<1>2. <2>a <3> <*>. <+> QED\n']
+    tokens = list(lexer.tokenize(lines))
+    assert [t.kind for t in tokens] == ['step'] * 5 + ['word']
+    names = [lexer.step_name(t) for t in tokens[:5]]
+    assert names == [
+        ('1', '2'), ('2', 'a'), ('3', ''), ('*', ''), ('+', '')]
+
+
+def test_module_name():
+    tok, = lexer.tokenize(['-------- MODULE Foo_proofs --------\n'])
+    assert tok.kind == 'module'
+    assert lexer.module_name(tok) == 'Foo_proofs'
+
+
+def test_prose():
+    lines = [
+        'Some `prose` (* not a comment\n',
+        '---- MODULE Foo ----\n',
+        '---- MODULE Bar ----\n',
+        'x == 1\n',
+        '====\n',
+        'y == 2\n',
+        '==== trailing\n',
+        '  more prose\n']
+    assert _kinds(lines, prose=True) == [
+        ('comment', 'Some `prose` (* not a comment'),
+        ('module', '---- MODULE Foo ----'),
+        ('module', '---- MODULE Bar ----'),
+        ('word', 'x'), ('symbol', '=='), ('word', '1'),
+        ('rule', '===='),
+        ('word', 'y'), ('symbol', '=='), ('word', '2'),
+        ('rule', '===='), ('comment', 'trailing'),
+        ('comment', 'more prose')]
+    # without `prose`, lines are tokenized as a module body
+    assert _kinds(lines[:1]) == [
+        ('word', 'Some'), ('symbol', '`'), ('word', 'prose'),
+        ('symbol', '`'), ('comment', '(* not a comment')]
+
+
+def test_tokenize_lines_is_lazy():
+    def lines():
+        yield '---- MODULE Foo ----\n'
+        raise AssertionError('read too far')
+    line, tokens = next(lexer.tokenize_lines(lines()))
+    assert line == '---- MODULE Foo ----\n'
+    assert [t.kind for t in tokens] == ['module']
+
+
+def test_read_lines():
+    with tempfile.TemporaryDirectory() as d:
+        fname = os.path.join(d, 'Foo.tla')
+        with open(fname, 'w') as f:
+            f.write('a\nb')
+        assert list(lexer.read_lines(fname)) == ['a\n', 'b']
+        with open(fname, 'w') as f:
+            pass
+        assert list(lexer.read_lines(fname)) == []
@@ -0,0 +1,190 @@
+"""Tests of `tlapy.proof_graph`, using the parser of `tla`."""
+import os
+import tempfile
+
+import tla
+
+from tlapy import proof_graph as pg
+
+
+SPEC = (
+    '---- MODULE Foo ----\n'
+    'LEMMA L == TRUE OBVIOUS\n'
+    'THEOREM W == TRUE\n'
+    'THEOREM T == TRUE\n'
+    '  <1>1. TRUE\n'
+    '    OBVIOUS\n'
+    '  <1>2. TRUE\n'
+    '    <2>1. TRUE BY L\n'
+    '    <2> QED BY <2>1, L DEF T\n'
+    '  <1> USE L\n'
+    '  <1>. QED BY <1>1, <1>2\n'
+    'THEOREM TRUE BY L\n'
+    '====\n')
+
+
+def _write(fname, s):
+    with open(fname, 'w') as f:
+        f.write(s)
+
+
+def _proof_graph(compact):
+    """Return proof graph of `SPEC`."""
+    tree = tla.parse(SPEC)
+    return pg.proof_graph(tree, tla.make_nodes(), compact=compact)
+
+
+def _module_graph():
+    """Return proof graph of `SPEC`, as `CompactProofGraph`."""
+    with tempfile.TemporaryDirectory() as d:
+        fname = os.path.join(d, 'Foo.tla')
+        _write(fname, SPEC)
+        return pg.module_proof_graph(fname)
+
+
+def test_module_proof_graph():
+    g = _module_graph().to_networkx()
+    assert g.module_name == 'Foo'
+    # the theorem without proof has no node
+    assert g.theorems == ['L', 'T', 'UnnamedTheorem3'], g.theorems
+    labels = dict(g.nodes(data='label'))
+    steps = [u for u in g if isinstance(u, int)]
+    assert len(steps) == 6, steps
+    names = {labels[u]: u for u in steps}
+    levels = {name: g.nodes[u]['level'] for name, u in names.items()}
+    assert levels['<1>1'] == 1 and levels['<2>1'] == 2, levels
+    assert {g.nodes[u]['theorem'] for u in steps} == {'T'}
+    qed, = set(g.successors('T'))
+    assert labels[qed] == 'QED' and g.nodes[qed]['level'] == 1
+    assert set(g.successors(qed)) == {names['<1>1'], names['<1>2']}
+    # the QED step of the subproof
+    sub_qed, = set(g.successors(names['<1>2']))
+    assert set(g.successors(sub_qed)) == {names['<2>1'], 'L'}
+    assert set(g.successors(names['<2>1'])) == {'L'}
+    assert set(g.successors('UnnamedTheorem3')) == {'L'}
+
+
+def test_proof_graphs_of_directory():
+    with tempfile.TemporaryDirectory() as d:
+        os.makedirs(os.path.join(d, 'sub'))
+        a = os.path.join(d, 'Foo.tla')
+        b = os.path.join(d, 'sub', 'Bar.tla')
+        bad = os.path.join(d, 'sub', 'Bad.tla')
+        _write(a, SPEC)
+        _write(b, SPEC.replace('Foo', 'Bar'))
+        _write(bad, '---- MODULE Bad ----\nTHEOREM == ==\n====\n')
+        _write(os.path.join(d, 'notes.txt'), SPEC)
+        for jobs in (1, 2):
+            report = pg.proof_graphs([d], jobs=jobs)
+            graphs = report['graphs']
+            assert list(graphs) == [a, b], graphs
+            assert graphs[b].module_name == 'Bar'
+            assert len(graphs[a]) == len(graphs[b])
+            assert list(report['failed']) == [bad], report
+            assert 'Cannot parse' in report['failed'][bad], report
+
+
+def test_compact_graph_equals_networkx_graph():
+    g = _proof_graph(compact=False)
+    h = _proof_graph(compact=True)
+    assert isinstance(h, pg.CompactProofGraph)
+    assert h.module_name == g.module_name
+    assert h.theorems == g.theorems
+    assert len(h) == len(g)
+    assert list(h) == list(g)
+    for u in g:
+        assert u in h
+        assert h.node_attributes(u) == g.nodes[u], u
+        assert h.successors(u) == sorted(
+            g.successors(u), key=h.node_id), u
+        assert h.node_key(h.node_id(u)) == u
+    assert h.number_of_edges() == g.number_of_edges()
+    k = h.to_networkx()
+    assert list(k.nodes(data=True)) == list(g.nodes(data=True))
+    assert set(k.edges) == set(g.edges)
+    assert (k.module_name, k.theorems) == (g.module_name, g.theorems)
+
+
+def test_compact_graph():
+    g = pg.CompactProofGraph()
+    g.add_node('A', style='filled')
+    g.add_node('B', style='filled')
+    g.add_edge('A', 'C')
+    g.add_edge('A', 'B')
+    g.add_edge('A', 'C')
+    g.add_node('A', label='a')
+    indptr, indices = g.csr()
+    assert list(indptr) == [0, 2, 2, 2], indptr
+    # successors in increasing order, without repeated edges
+    assert list(indices) == [1, 2], indices
+    assert g.number_of_edges() == 2
+    assert g.node_attributes('A') == dict(style='filled', label='a')
+    assert g.node_attributes('C') == dict()
+    # nodes with equal attributes share them
+    assert len(g._attrs) == 3, g._attrs
+    g.add_edge('C', 'A')
+    assert g.successors('C') == ['A']
+
+
+def test_collapse_subproofs():
+    for compact in (False, True):
+        g = _proof_graph(compact)
+        h = pg.collapse_subproofs(g, 1)
+        labels = dict(h.nodes(data='label'))
+        steps = [u for u in h if isinstance(u, int)]
+        assert len(steps) == 4, steps
+        assert '<1>2 (+2 steps)' in labels.values(), labels
+        u, = [u for u in steps if labels[u].startswith('<1>2')]
+        # edges of the merged steps, without self-loops
+        assert set(h.successors(u)) == {'L'}
+        assert h.theorems == g.theorems
+        h = pg.collapse_subproofs(g, 0)
+        assert not [u for u in h if isinstance(u, int)]
+        assert h.nodes['T']['label'] == 'T (+6 steps)'
+        assert set(h.successors('T')) == {'L'}
+    try:
+        pg.collapse_subproofs(g, -1)
+    except ValueError:
+        pass
+    else:
+        raise AssertionError('negative level not reported')
+
+
+def test_select_theorems():
+    g = _proof_graph(compact=True)
+    h = pg.select_theorems(g, ['T'])
+    assert 'T' in h and 'L' not in h
+    assert len(h) == 7, list(h)
+    assert h.theorems == ['T']
+    h = pg.select_theorems(g, ['T'], hops=1)
+    assert 'L' in h and 'UnnamedTheorem3' not in h
+    h = pg.select_theorems(g, ['UnnamedTheorem3'], hops=1)
+    assert set(h) == {'UnnamedTheorem3', 'L'}
+    assert set(h.edges) == {('UnnamedTheorem3', 'L')}
+    try:
+        pg.select_theorems(g, ['Missing'])
+    except ValueError:
+        pass
+    else:
+        raise AssertionError('missing theorem not reported')
+
+
+def test_dump_theorem_graphs():
+    g = _proof_graph(compact=True)
+    with tempfile.TemporaryDirectory() as d:
+        files = pg.dump_theorem_graphs(
+            g, outdir=d, fmt='dot', level=0, jobs=2)
+        names = [os.path.basename(f) for f in files]
+        assert names == [
+            'proof_graph_Foo_L.dot', 'proof_graph_Foo_T.dot',
+            'proof_graph_Foo_UnnamedTheorem3.dot'], names
+        with open(files[1], 'r') as f:
+            s = f.read()
+        assert '"T" -> "L";' not in s, s
+        assert '"label"="T (+6 steps)"' in s, s
+        fname = os.path.join(d, 'g.jsonl')
+        pg.dump_proof_graph(g, fname, theorems=['T'], level=1)
+        with open(fname, 'r') as f:
+            lines = f.read().splitlines()
+        # the graph, the theorem and 4 steps, and 3 edges
+        assert len(lines) == 1 + 5 + 3, lines
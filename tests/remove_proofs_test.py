@@ -0,0 +1,70 @@
+"""Tests of `tlapy.utils.remove_proofs`."""
+import os
+import tempfile
+
+from tlapy.utils import remove_proofs as rp
+
+
+SPEC = (
+    '---- MODULE Foo_proofs ----\n'
+    'THEOREM T == TRUE\n'
+    '  <1>1. TRUE\n'
+    '    OBVIOUS\n'
+    '  <1>. QED BY <1>1\n'
+    '====\n')
+HEADER = (
+    '(* This file was automatically generated from the file:\n'
+    '    "Foo_proofs.tla"\n'
+    '*)\n'
+    '---- MODULE Foo_header ----\n'
+    'THEOREM T == TRUE\n'
+    '====\n')
+
+
+def _write(fname, s):
+    with open(fname, 'w') as f:
+        f.write(s)
+
+
+def _read(fname):
+    with open(fname, 'r') as f:
+        return f.read()
+
+
+def test_remove_proofs():
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as d:
+        os.chdir(d)
+        try:
+            _write('Foo_proofs.tla', SPEC)
+            assert rp.remove_proofs('Foo_proofs.tla')
+            assert _read('Foo_header.tla') == HEADER
+            assert os.path.isfile(rp.MANIFEST_FILE)
+            # source unchanged
+            assert not rp.remove_proofs('Foo_proofs.tla')
+            # only proofs changed: the header is not written
+            _write('Foo_proofs.tla', SPEC.replace('OBVIOUS', 'BY DEF T'))
+            mtime = os.stat('Foo_header.tla').st_mtime_ns
+            assert not rp.remove_proofs('Foo_proofs.tla')
+            assert os.stat('Foo_header.tla').st_mtime_ns == mtime
+            # header changed by hand: it is regenerated
+            _write('Foo_header.tla', HEADER + '\n')
+            assert rp.remove_proofs('Foo_proofs.tla')
+            assert _read('Foo_header.tla') == HEADER
+        finally:
+            os.chdir(cwd)
+
+
+def test_remove_proofs_files_in_parallel():
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as d:
+        os.chdir(d)
+        try:
+            _write('Foo_proofs.tla', SPEC)
+            _write('Bar_proofs.tla', SPEC.replace('Foo', 'Bar'))
+            files = ['Foo_proofs.tla', 'Bar_proofs.tla']
+            headers = rp.remove_proofs_files(files, jobs=2)
+            assert headers == ['Foo_header.tla', 'Bar_header.tla'], headers
+            assert rp.remove_proofs_files(files, jobs=2) == list()
+        finally:
+            os.chdir(cwd)
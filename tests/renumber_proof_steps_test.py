@@ -0,0 +1,127 @@
+"""Tests of `tlapy.utils.renumber_proof_steps`."""
+import os
+import tempfile
+
+from tlapy.utils import renumber_proof_steps as rps
+
+
+def test_renumber_levels():
+    spec = (
+        'THEOREM Thm == TRUE\n'
+        '<1>3. TRUE\n'
+        '  <2>7. TRUE\n'
+        '  <2>9. TRUE\n'
+        '    BY <2>7\n'
+        '  <2>. QED\n'
+        '    BY <2>7, <2>9\n'
+        '<1>5. TRUE\n'
+        '  <2>2. TRUE\n'
+        '  <2>. QED BY <2>2\n'
+        '<1>. QED\n'
+        '  BY <1>3, <1>5\n')
+    expected = (
+        'THEOREM Thm == TRUE\n'
+        '<1>1. TRUE\n'
+        '  <2>1. TRUE\n'
+        '  <2>2. TRUE\n'
+        '    BY <2>1\n'
+        '  <2>. QED\n'
+        '    BY <2>1, <2>2\n'
+        '<1>2. TRUE\n'
+        '  <2>1. TRUE\n'
+        '  <2>. QED BY <2>1\n'
+        '<1>. QED\n'
+        '  BY <1>1, <1>2\n')
+    assert rps.renumber_steps(spec) == expected
+
+
+def test_renumber_references_to_enclosing_levels():
+    spec = (
+        'LEMMA Lem == TRUE\n'
+        '<1>4. TRUE\n'
+        '<1>8. TRUE\n'
+        '  <2>6. TRUE\n'
+        '    <3>5. TRUE\n'
+        '      BY <1>4, <2>6\n'
+        '    <3>. QED BY <3>5, <1>4\n'
+        '  <2>. QED BY <2>6, <1>4\n'
+        '<1>. QED BY <1>8\n')
+    expected = (
+        'LEMMA Lem == TRUE\n'
+        '<1>1. TRUE\n'
+        '<1>2. TRUE\n'
+        '  <2>1. TRUE\n'
+        '    <3>1. TRUE\n'
+        '      BY <1>1, <2>1\n'
+        '    <3>. QED BY <3>1, <1>1\n'
+        '  <2>. QED BY <2>1, <1>1\n'
+        '<1>. QED BY <1>2\n')
+    assert rps.renumber_steps(spec) == expected
+
+
+def test_renumber_resets_at_theorems():
+    spec = (
+        'THEOREM A == TRUE\n'
+        '<1>3. TRUE\n'
+        '<1>. QED BY <1>3\n'
+        '\n'
+        'COROLLARY B == TRUE\n'
+        '<1>7. TRUE\n'
+        '<1>9. TRUE\n'
+        '<1>. QED BY <1>7, <1>9\n')
+    expected = (
+        'THEOREM A == TRUE\n'
+        '<1>1. TRUE\n'
+        '<1>. QED BY <1>1\n'
+        '\n'
+        'COROLLARY B == TRUE\n'
+        '<1>1. TRUE\n'
+        '<1>2. TRUE\n'
+        '<1>. QED BY <1>1, <1>2\n')
+    assert rps.renumber_steps(spec) == expected
+
+
+def test_renumber_skips_comments_strings_and_labels():
+    spec = (
+        'THEOREM Thm == TRUE\n'
+        '<1>3. TRUE  \\* see <1>3\n'
+        '(* <1>3. TRUE\n'
+        '   <1>5 *)\n'
+        '<1>a. "<1>3"\n'
+        '<1>. QED BY <1>3, <1>a (* <1>3 *)\n')
+    expected = (
+        'THEOREM Thm == TRUE\n'
+        '<1>1. TRUE  \\* see <1>3\n'
+        '(* <1>3. TRUE\n'
+        '   <1>5 *)\n'
+        '<1>a. "<1>3"\n'
+        '<1>. QED BY <1>1, <1>a (* <1>3 *)\n')
+    assert rps.renumber_steps(spec) == expected
+
+
+def test_renumber_is_idempotent():
+    spec = (
+        'THEOREM Thm == TRUE\n'
+        '<1>1. TRUE\n'
+        '<1>. QED BY <1>1\n')
+    assert rps.renumber_steps(spec) == spec
+
+
+def test_renumber_file_ranges():
+    spec = (
+        'THEOREM A == TRUE\n'
+        '<1>3. TRUE\n'
+        '<1>. QED BY <1>3\n'
+        'THEOREM B == TRUE\n'
+        '<1>5. TRUE\n'
+        '<1>. QED BY <1>5\n')
+    with tempfile.TemporaryDirectory() as d:
+        fname = os.path.join(d, 'Foo.tla')
+        with open(fname, 'w') as f:
+            f.write(spec)
+        assert rps.renumber_file(fname, ['B']) == fname
+        with open(fname, 'r') as f:
+            s = f.read()
+        assert s == spec.replace('<1>5', '<1>1'), s
+        # unchanged files are not written
+        assert rps.renumber_file(fname, [(4, None)]) is None
@@ -0,0 +1,75 @@
+"""Tests of `tlapy.utils.replace_even_backticks`."""
+import os
+import shutil
+import tempfile
+
+from tlapy.utils import replace_even_backticks as reb
+
+
+TESTS_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def _replace(fname):
+    with open(os.path.join(TESTS_DIR, fname), 'r') as f:
+        return ''.join(reb.replace_backticks(f))
+
+
+def test_replace_in_comments():
+    s = _replace('TestCodeBlockConversion.tla')
+    assert "(* `Foo' is the name of `bar' and `foo'. *)" in s, s
+
+
+def test_replace_in_prose_outside_module():
+    s = _replace('TestProseConversion.tla')
+    lines = s.splitlines()
+    assert lines[0] == "Prose with `code' and `more'.", lines
+    # strings are unchanged
+    assert lines[3] == 'x == "`a`" \\* `b\' and `c\'', lines
+    assert lines[5] == "After the module, `d' and `e'.", lines
+
+
+def test_code_blocks():
+    lines = [
+        '(* Example:\n',
+        '```tla\n',
+        'x == `y`\n',
+        '```\n',
+        'with `z`. *)\n']
+    s = ''.join(reb.replace_backticks(lines))
+    assert s == (
+        '(* Example:\n'
+        '`.\n'
+        'x == `y`\n'
+        ".'\n"
+        "with `z'. *)\n"), s
+
+
+def test_converting_twice_changes_nothing():
+    lines = [
+        '(* Example:\n',
+        '```tla\n',
+        'x == `y`\n',
+        '```\n',
+        "with `z`. and `w' *)\n"]
+    once = list(reb.replace_backticks(lines))
+    assert once[-1] == "with `z'. and `w' *)\n", once
+    twice = list(reb.replace_backticks(once))
+    assert twice == once, twice
+    for fname in ('TestCodeBlockConversion.tla', 'TestProseConversion.tla'):
+        s = _replace(fname)
+        again = ''.join(reb.replace_backticks(s.splitlines(True)))
+        assert again == s, (fname, again)
+
+
+def test_convert_inplace():
+    with tempfile.TemporaryDirectory() as d:
+        fname = os.path.join(d, 'TestProseConversion.tla')
+        shutil.copyfile(os.path.join(TESTS_DIR, 'TestProseConversion.tla'),
+                        fname)
+        assert reb.convert_inplace(fname)
+        with open(fname, 'r') as f:
+            s = f.read()
+        assert s == _replace('TestProseConversion.tla'), s
+        mtime = os.stat(fname).st_mtime_ns
+        assert not reb.convert_inplace(fname)
+        assert os.stat(fname).st_mtime_ns == mtime
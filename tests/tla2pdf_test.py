@@ -0,0 +1,165 @@
+"""Tests of `tlapy.tla2pdf`, using a stub of `tla2tex`."""
+import contextlib
+import os
+import sys
+import tempfile
+
+from tlapy import tla2pdf
+
+
+# stand-in for `tla2tex.TLA`: writes the PDF file, records its call,
+# sleeps if the module asks to, and fails if the module says `FAIL`
+STUB_TLA2TEX = r'''#!{python}
+import os
+import sys
+import time
+
+fname = sys.argv[-1]
+with open(fname) as f:
+    s = f.read()
+with open({calls!r}, 'a') as f:
+    f.write(fname + '\n')
+if 'SLEEP' in s:
+    time.sleep(0.3)
+if 'FAIL' in s:
+    sys.exit(1)
+base, _ = os.path.splitext(fname)
+with open(base + '.pdf', 'w') as f:
+    f.write(' '.join(sys.argv[1:]))
+'''
+
+
+@contextlib.contextmanager
+def _workdir():
+    """Yield temporary directory with a stub `tla2tex` in `PATH`.
+
+    The directory is the current directory while in the context.
+    """
+    cwd = os.getcwd()
+    path = os.environ['PATH']
+    with tempfile.TemporaryDirectory() as d:
+        os.chdir(d)
+        try:
+            os.makedirs('bin')
+            stub = os.path.join(d, 'bin', tla2pdf.TLA2TEX)
+            _write(stub, STUB_TLA2TEX.format(
+                python=sys.executable,
+                calls=os.path.join(d, 'calls')))
+            os.chmod(stub, 0o755)
+            os.environ['PATH'] = os.path.join(d, 'bin') + os.pathsep + path
+            yield d
+        finally:
+            os.environ['PATH'] = path
+            os.chdir(cwd)
+
+
+def _write(fname, s):
+    with open(fname, 'w') as f:
+        f.write(s)
+
+
+def _calls():
+    """Return files that the stub `tla2tex` was called with."""
+    if not os.path.isfile('calls'):
+        return list()
+    with open('calls', 'r') as f:
+        return f.read().splitlines()
+
+
+def _statuses(results):
+    return [(r.tlafile, r.status) for r in results]
+
+
+def test_manifest_skips_unchanged_files():
+    with _workdir():
+        _write('a.tla', 'a == 1\n')
+        results = tla2pdf.typeset_tla_files(['a.tla'], list())
+        assert _statuses(results) == [('a.tla', 'done')]
+        assert os.path.isfile('a.pdf')
+        assert os.path.isfile(tla2pdf.MANIFEST_FILE)
+        results = tla2pdf.typeset_tla_files(['a.tla'], list())
+        assert _statuses(results) == [('a.tla', 'skipped')]
+        # a new modification time alone does not rebuild
+        st = os.stat('a.tla')
+        os.utime('a.tla', ns=(st.st_atime_ns, st.st_mtime_ns + 10**9))
+        results = tla2pdf.typeset_tla_files(['a.tla'], list())
+        assert _statuses(results) == [('a.tla', 'skipped')]
+        assert _calls() == ['a.tla'], _calls()
+        # changed source
+        _write('a.tla', 'a == 2\n')
+        results = tla2pdf.typeset_tla_files(['a.tla'], list())
+        assert _statuses(results) == [('a.tla', 'done')]
+        # missing PDF
+        os.remove('a.pdf')
+        results = tla2pdf.typeset_tla_files(['a.tla'], list())
+        assert _statuses(results) == [('a.tla', 'done')]
+        assert len(_calls()) == 3, _calls()
+
+
+def test_manifest_records_options_and_style():
+    with _workdir():
+        _write('a.tla', 'a == 1\n')
+        _write('my.sty', '% style\n')
+        options = ['-style', 'my']
+        tla2pdf.typeset_tla_files(['a.tla'], list())
+        results = tla2pdf.typeset_tla_files(['a.tla'], options)
+        assert _statuses(results) == [('a.tla', 'done')]
+        results = tla2pdf.typeset_tla_files(['a.tla'], options)
+        assert _statuses(results) == [('a.tla', 'skipped')]
+        _write('my.sty', '% changed style\n')
+        results = tla2pdf.typeset_tla_files(['a.tla'], options)
+        assert _statuses(results) == [('a.tla', 'done')]
+        assert len(_calls()) == 3, _calls()
+
+
+def test_jobs_report_in_order():
+    with _workdir():
+        # the first file takes longest
+        _write('a.tla', 'SLEEP\n')
+        _write('b.tla', 'b == 1\n')
+        _write('c.tla', 'c == 1\n')
+        files = ['a.tla', 'b.tla', 'c.tla']
+        results = tla2pdf.typeset_tla_files(files, list(), jobs=3)
+        assert [r.tlafile for r in results] == files
+        for r in results:
+            assert r.status == 'done', r
+            assert 'Typesetting file "{f}"'.format(f=r.tlafile) in r.stdout
+        results = tla2pdf.typeset_tla_files(files, list(), jobs=3)
+        assert [r.status for r in results] == 3 * ['skipped']
+        assert results[0].stdout.startswith('Skip "a.tla"'), results[0]
+
+
+def test_failure_cancels_pending_jobs():
+    with _workdir():
+        _write('a.tla', 'FAIL\n')
+        _write('b.tla', 'b == 1\n')
+        _write('c.tla', 'c == 1\n')
+        files = ['a.tla', 'b.tla', 'c.tla']
+        try:
+            tla2pdf.typeset_tla_files(files, list(), jobs=1)
+        except RuntimeError as e:
+            assert 'a.tla' in str(e), e
+        else:
+            raise AssertionError('failure not reported')
+        assert _calls() == ['a.tla'], _calls()
+        # the manifest records no failed file
+        assert not os.path.isfile('a.pdf')
+
+
+def test_keep_going():
+    with _workdir():
+        _write('a.tla', 'FAIL\n')
+        _write('b.tla', 'b == 1\n')
+        files = ['a.tla', 'b.tla']
+        try:
+            tla2pdf.typeset_tla_files(
+                files, list(), jobs=2, keep_going=True)
+        except RuntimeError:
+            pass
+        else:
+            raise AssertionError('failure not reported')
+        assert sorted(_calls()) == files, _calls()
+        assert os.path.isfile('b.pdf')
+        # the successful file is recorded
+        results = tla2pdf.typeset_tla_files(['b.tla'], list())
+        assert _statuses(results) == [('b.tla', 'skipped')]
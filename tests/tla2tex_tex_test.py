@@ -0,0 +1,286 @@
+"""Tests of `tlapy.tla2tex_tex`, using a stub of `tlaenv`."""
+import contextlib
+import os
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+
+from tlapy import tla2tex_tex
+
+
+# stand-in for `tla2tex.TeX`: replaces each `tla` environment
+# by a `tlatex` environment, and counts its calls
+STUB_TLAENV = r'''#!{python}
+import re
+import sys
+
+fname = sys.argv[-1]
+with open(fname) as f:
+    s = f.read()
+
+
+def convert(m):
+    body = ''.join('\\@x{{%s}}\n' % line for line in m.group(1).splitlines())
+    return '\\begin{{tlatex}}\n' + body + '\\@pvspace{{8.0pt}}%\n\\end{{tlatex}}'
+
+
+s = re.sub(r'\\begin\{{tla\}}\n(.*?)\n\\end\{{tla\}}', convert, s, flags=re.S)
+with open(fname, 'w') as f:
+    f.write(s)
+with open('tlatex.pdf', 'w') as f:
+    pass
+with open({calls!r}, 'a') as f:
+    f.write('call\n')
+'''
+
+
+@contextlib.contextmanager
+def _workdir():
+    """Yield temporary directory with a preamble and a stub `tlaenv`.
+
+    The directory is the current directory while in the context,
+    and the stub is first in `PATH`.
+    """
+    cwd = os.getcwd()
+    path = os.environ['PATH']
+    with tempfile.TemporaryDirectory() as d:
+        os.chdir(d)
+        try:
+            os.makedirs('bin')
+            os.makedirs('tex')
+            os.makedirs(tla2tex_tex.CACHE_DIR)
+            with open(tla2tex_tex.PREAMBLE, 'w') as f:
+                f.write('')
+            stub = os.path.join(d, 'bin', tla2tex_tex.TLAENV)
+            with open(stub, 'w') as f:
+                f.write(STUB_TLAENV.format(
+                    python=sys.executable,
+                    calls=os.path.join(d, 'calls')))
+            os.chmod(stub, 0o755)
+            os.environ['PATH'] = os.path.join(d, 'bin') + os.pathsep + path
+            yield d
+        finally:
+            os.environ['PATH'] = path
+            os.chdir(cwd)
+
+
+def _write(fname, s):
+    with open(fname, 'w') as f:
+        f.write(s)
+
+
+def _read(fname):
+    with open(fname, 'r') as f:
+        return f.read()
+
+
+def _calls():
+    """Return number of calls of the stub `tlaenv`."""
+    if not os.path.isfile('calls'):
+        return 0
+    return len(_read('calls').splitlines())
+
+
+def _output(name):
+    return os.path.join(tla2tex_tex.CACHE_DIR, name + '.tex')
+
+
+def test_convert():
+    with _workdir():
+        _write('a.tla', 'x == 1\n')
+        _write('b.tla', 'y == 2\n')
+        pairs = [('a.tla', _output('a')), ('b.tla', _output('b'))]
+        tla2tex_tex.convert(pairs)
+        # both environments in one call
+        assert _calls() == 1, _calls()
+        s = _read(_output('a'))
+        assert '\\@x{x == 1}' in s, s
+        assert s.startswith('\\vspace{2.0pt}%'), s
+        assert '\\@pvspace{8.0pt}' not in s, s
+        assert '\\@x{y == 2}' in _read(_output('b'))
+        # no work directory left
+        names = os.listdir(tla2tex_tex.CACHE_DIR)
+        assert not any(
+            name.startswith(tla2tex_tex.WORKDIR_PREFIX)
+            for name in names), names
+
+
+def test_cache_hit():
+    with _workdir():
+        _write('a.tla', 'x == 1\n')
+        _write('b.tla', 'y == 2\n')
+        pairs = [('a.tla', _output('a')), ('b.tla', _output('b'))]
+        tla2tex_tex.convert(pairs)
+        assert _calls() == 1, _calls()
+        tla2tex_tex.convert(pairs)
+        assert _calls() == 1, _calls()
+        # with memo, as the server converts
+        memo = tla2tex_tex._load_memo()
+        tla2tex_tex.convert(pairs, memo=memo)
+        assert _calls() == 1, _calls()
+        # only the changed environment is converted
+        _write('b.tla', 'y == 3\n')
+        tla2tex_tex.convert(pairs, memo=memo)
+        assert _calls() == 2, _calls()
+        assert '\\@x{y == 3}' in _read(_output('b'))
+        assert '\\@x{x == 1}' in _read(_output('a'))
+
+
+def test_server_round_trip():
+    with _workdir():
+        _write('a.tla', 'x == 1\n')
+        env = dict(os.environ)
+        env['PYTHONPATH'] = os.pathsep.join(
+            p for p in [_package_dir(), env.get('PYTHONPATH')] if p)
+        server = subprocess.Popen(
+            [sys.executable, '-m', 'tlapy.tla2tex_tex', '--serve'],
+            env=env, stdout=subprocess.DEVNULL)
+        try:
+            _wait_for_server()
+            argv = ['-i', 'a.tla', '-o', _output('a')]
+            response = tla2tex_tex.request(argv)
+            assert response == dict(error=None), response
+            assert '\\@x{x == 1}' in _read(_output('a'))
+            assert _calls() == 1, _calls()
+            # memoized by the server
+            response = tla2tex_tex.request(argv)
+            assert response == dict(error=None), response
+            assert _calls() == 1, _calls()
+            # errors are returned to the client
+            argv = ['-i', 'missing.tla', '-o', _output('m')]
+            response = tla2tex_tex.request(argv)
+            assert response['error'] is not None, response
+            # invalid arguments do not stop the server
+            response = tla2tex_tex.request(['-i', 'a.tla'])
+            assert 'one output file' in response['error'], response
+            response = tla2tex_tex.request(['--max-age', 'x'])
+            assert 'invalid float' in response['error'], response
+            response = tla2tex_tex.request(['--help'])
+            assert response['error'] is not None, response
+            assert tla2tex_tex.request(None) == dict(error=None)
+        finally:
+            server.send_signal(signal.SIGTERM)
+            server.wait(timeout=10)
+        assert not os.path.exists(tla2tex_tex.SOCKET_FILE)
+        assert tla2tex_tex.request(None) is None
+
+
+def _package_dir():
+    """Return directory that contains the package `tlapy`."""
+    return os.path.dirname(os.path.dirname(
+        os.path.abspath(tla2tex_tex.__file__)))
+
+
+def _wait_for_server(timeout=10):
+    """Return when a server answers on `SOCKET_FILE`."""
+    end = time.time() + timeout
+    while time.time() < end:
+        if tla2tex_tex.request(None) is not None:
+            return
+        time.sleep(0.05)
+    raise AssertionError('server did not start')
+
+
+def test_collect_garbage():
+    with _workdir():
+        for name in ('a', 'b', 'c'):
+            _write(name + '.tla', name + ' == 1\n')
+        pairs = [(name + '.tla', _output(name)) for name in ('a', 'b', 'c')]
+        tla2tex_tex.convert(pairs)
+        # `a` is the least recently used
+        time.sleep(0.01)
+        tla2tex_tex.convert(pairs[1:])
+        tla2tex_tex._collect_garbage(max_entries=2)
+        assert not os.path.isfile(_output('a'))
+        assert os.path.isfile(_output('b'))
+        assert os.path.isfile(_output('c'))
+        # removed files are converted again
+        tla2tex_tex.convert(pairs)
+        assert _calls() == 2, _calls()
+        assert os.path.isfile(_output('a'))
+        # files unused for `max_age` days are removed
+        tla2tex_tex._collect_garbage(max_age=-1)
+        for name in ('a', 'b', 'c'):
+            assert not os.path.isfile(_output(name)), name
+
+
+def test_stale_workdirs():
+    with _workdir():
+        old = os.path.join(tla2tex_tex.CACHE_DIR, 'tla2tex_old')
+        new = os.path.join(tla2tex_tex.CACHE_DIR, 'tla2tex_new')
+        os.makedirs(old)
+        os.makedirs(new)
+        t = time.time() - 2 * tla2tex_tex.STALE_WORKDIR_AGE
+        os.utime(old, (t, t))
+        tla2tex_tex._collect_garbage()
+        assert not os.path.exists(old)
+        assert os.path.isdir(new)
+
+
+def test_tool_version():
+    with _workdir() as d:
+        _write('a.tla', 'x == 1\n')
+        pairs = [('a.tla', _output('a'))]
+        tla2tex_tex.convert(pairs)
+        assert _calls() == 1, _calls()
+        # upgrading the tool invalidates outputs
+        stub = os.path.join(d, 'bin', tla2tex_tex.TLAENV)
+        with open(stub, 'a') as f:
+            f.write('# new version\n')
+        tla2tex_tex.convert(pairs)
+        assert _calls() == 2, _calls()
+        tla2tex_tex.convert(pairs)
+        assert _calls() == 2, _calls()
+        # the environment variable overrides the version
+        os.environ[tla2tex_tex.TOOL_VERSION_VAR] = '2.0'
+        try:
+            tla2tex_tex.convert(pairs)
+            assert _calls() == 3, _calls()
+            with open(stub, 'a') as f:
+                f.write('# newer version\n')
+            tla2tex_tex.convert(pairs)
+            assert _calls() == 3, _calls()
+        finally:
+            del os.environ[tla2tex_tex.TOOL_VERSION_VAR]
+
+
+def test_shared_cache():
+    with _workdir() as d:
+        shared = os.path.join(d, 'shared')
+        os.environ[tla2tex_tex.SHARED_CACHE_VAR] = shared
+        try:
+            _write('a.tla', 'x == 1\n')
+            tla2tex_tex.convert([('a.tla', _output('a'))])
+            assert _calls() == 1, _calls()
+            expected = _read(_output('a'))
+            files = [
+                os.path.join(root, name)
+                for root, _, names in os.walk(shared)
+                for name in names]
+            assert len(files) == 1, files
+            assert _read(files[0]) == expected
+            assert os.stat(files[0]).st_mode & 0o777 == (
+                tla2tex_tex.FILE_MODE)
+            # another working directory with the same environment
+            os.makedirs('other')
+            os.chdir('other')
+            os.makedirs('tex')
+            os.makedirs(tla2tex_tex.CACHE_DIR)
+            _write(tla2tex_tex.PREAMBLE, '')
+            _write('b.tla', 'x == 1\n')
+            tla2tex_tex.convert([('b.tla', _output('b'))])
+            assert _calls_in(d) == 1, _calls_in(d)
+            assert _read(_output('b')) == expected
+            # a different environment is converted
+            _write('c.tla', 'x == 2\n')
+            tla2tex_tex.convert([('c.tla', _output('c'))])
+            assert _calls_in(d) == 2, _calls_in(d)
+        finally:
+            del os.environ[tla2tex_tex.SHARED_CACHE_VAR]
+
+
+def _calls_in(d):
+    """Return number of calls of the stub `tlaenv` of `_workdir` `d`."""
+    return len(_read(os.path.join(d, 'calls')).splitlines())
@@ -0,0 +1,156 @@
+"""Tests of `tlapy.tla_build`, using stubs of `tla2tex` and `xelatex`."""
+import contextlib
+import os
+import sys
+import tempfile
+
+from PyPDF2 import PdfReader
+
+from tlapy import tla_build
+from tlapy import tla_depends
+from tlapy.utils import join_modules
+
+
+# stand-in for `tla2tex.TLA` and `xelatex`: writes a PDF file
+# with one blank page next to the input file, and records its call
+STUB = r'''#!{python}
+import os
+import sys
+
+from PyPDF2 import PdfWriter
+
+fname = sys.argv[-1]
+with open({calls!r}, 'a') as f:
+    f.write(fname + '\n')
+base, _ = os.path.splitext(fname)
+w = PdfWriter()
+w.add_blank_page(72, 72)
+with open(base + '.pdf', 'wb') as f:
+    w.write(f)
+'''
+TOP = (
+    '---- MODULE Top ----\n'
+    'EXTENDS A_header, Lib, Naturals\n'
+    '====\n')
+A_PROOFS = (
+    '---- MODULE A_proofs ----\n'
+    'THEOREM T == TRUE\n'
+    '  <1>1. TRUE\n'
+    '    OBVIOUS\n'
+    '  <1>. QED BY <1>1\n'
+    '====\n')
+LIB = (
+    '---- MODULE Lib ----\n'
+    '====\n')
+
+
+@contextlib.contextmanager
+def _workdir():
+    """Yield temporary directory with modules and stubs.
+
+    The directory is the current directory while in the context.
+    The root module is `specs/Top.tla`, and the library is `lib`.
+    """
+    cwd = os.getcwd()
+    path = os.environ['PATH']
+    with tempfile.TemporaryDirectory() as d:
+        os.chdir(d)
+        try:
+            for dirname in ('bin', 'specs', 'lib'):
+                os.makedirs(dirname)
+            for name in ('tla2tex', 'xelatex'):
+                stub = os.path.join(d, 'bin', name)
+                _write(stub, STUB.format(
+                    python=sys.executable,
+                    calls=os.path.join(d, 'calls')))
+                os.chmod(stub, 0o755)
+            os.environ['PATH'] = os.path.join(d, 'bin') + os.pathsep + path
+            _write('specs/Top.tla', TOP)
+            _write('specs/A_proofs.tla', A_PROOFS)
+            _write('lib/Lib.tla', LIB)
+            yield d
+        finally:
+            os.environ['PATH'] = path
+            os.chdir(cwd)
+
+
+def _write(fname, s):
+    with open(fname, 'w') as f:
+        f.write(s)
+
+
+def _outline(fname):
+    """Return bookmark titles of PDF file `fname`."""
+    return [item.title for item in PdfReader(fname).outline]
+
+
+def test_build_in_subdirectory_with_merge():
+    with _workdir():
+        roots = ['specs/Top.tla']
+        files = tla_build.build(
+            roots, list(), merge=True, search_path=['lib'])
+        assert 'specs/A_header.tla' in files, files
+        assert os.path.isfile('specs/A_header.tla')
+        assert os.path.isfile('specs/Top.pdf')
+        assert os.path.isfile('specs/A_header.pdf')
+        assert os.path.isfile(join_modules.MERGED_FILE)
+        outline = _outline(join_modules.MERGED_FILE)
+        assert 'Top' in outline, outline
+        assert 'A_header' in outline, outline
+        # library modules are not built by default
+        assert 'Lib' not in outline, outline
+        assert not os.path.exists('lib/Lib.pdf')
+        assert os.path.isfile(tla_build.MANIFEST_FILE)
+        # nothing changed
+        files = tla_build.build(
+            roots, list(), merge=True, search_path=['lib'])
+        assert files == list(), files
+
+
+def test_directories_are_listed_once():
+    with _workdir():
+        _write('specs/Other.tla', TOP.replace('Top', 'Other'))
+        listed = list()
+        module_index = tla_depends.module_index
+
+        def counting_index(search_path):
+            listed.extend(search_path)
+            return module_index(search_path)
+
+        tla_depends.module_index = counting_index
+        try:
+            g = tla_build.build_graph(
+                ['specs/Top.tla', 'specs/Other.tla'],
+                search_path=['lib'])
+        finally:
+            tla_depends.module_index = module_index
+        assert sorted(listed) == ['lib', 'specs'], listed
+        assert g.nodes['specs/Top.tla']['kind'] == 'module'
+        assert g.nodes['specs/A_header.tla']['kind'] == 'header'
+
+
+def test_build_libraries():
+    with _workdir():
+        files = tla_build.build(
+            ['specs/Top.tla'], list(), search_path=['lib'],
+            libraries=True)
+        assert 'lib/Lib.pdf' in files, files
+        assert os.path.isfile('lib/Lib.pdf')
+
+
+def test_options_and_style_changes_rebuild_pdfs():
+    with _workdir():
+        roots = ['specs/Top.tla']
+        _write('my.sty', '% style\n')
+        options = ['-style', 'my.sty']
+        tla_build.build(roots, options)
+        assert tla_build.build(roots, options, dry_run=True) == list()
+        # changed style file
+        _write('my.sty', '% changed style\n')
+        files = tla_build.build(roots, options, dry_run=True)
+        assert sorted(files) == ['specs/A_header.pdf', 'specs/Top.pdf']
+        tla_build.build(roots, options)
+        assert tla_build.build(roots, options, dry_run=True) == list()
+        # changed options
+        files = tla_build.build(roots, list(), dry_run=True)
+        assert sorted(files) == ['specs/A_header.pdf', 'specs/Top.pdf']
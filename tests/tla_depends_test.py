@@ -0,0 +1,106 @@
+"""Tests of `tlapy.tla_depends`."""
+import os
+import tempfile
+
+from tlapy import tla_depends
+
+
+def _dependencies(s):
+    return tla_depends._header_dependencies(s.splitlines(True))
+
+
+def test_extends():
+    s = (
+        '---- MODULE M ----\n'
+        'EXTENDS A, B\n'
+        '====\n')
+    assert _dependencies(s) == ['A', 'B']
+
+
+def test_multiline_extends():
+    s = (
+        '---- MODULE M ----\n'
+        'EXTENDS\n'
+        '    A,\n'
+        '    B,\n'
+        '    C\n'
+        'x == 1\n'
+        '====\n')
+    assert _dependencies(s) == ['A', 'B', 'C']
+
+
+def test_comments():
+    s = (
+        '(* The module M, which EXTENDS X. *)\n'
+        '---- MODULE M ----\n'
+        '\\* EXTENDS Y\n'
+        'EXTENDS A, (* Z, *) B, \\* W\n'
+        '    C\n'
+        '(*\n'
+        'INSTANCE V\n'
+        '*)\n'
+        '(* named *) G == INSTANCE G\n'
+        '====\n')
+    assert _dependencies(s) == ['A', 'B', 'C', 'G']
+
+
+def test_instances():
+    s = (
+        '---- MODULE M ----\n'
+        'EXTENDS A\n'
+        'CONSTANT N\n'
+        'VARIABLES x, y\n'
+        'INSTANCE B WITH z <- x\n'
+        'LOCAL INSTANCE C\n'
+        'G == INSTANCE D\n'
+        'H(p) == INSTANCE E WITH z <- p\n'
+        'K(p, F(_, _)) ==\n'
+        '    INSTANCE F\n'
+        'LOCAL L == INSTANCE G\n'
+        'INSTANCE H\n'
+        'Op == 1\n'
+        'INSTANCE Unread\n'
+        '====\n')
+    expected = ['A', 'B', 'C', 'D', 'E', 'F', 'G', 'H']
+    assert _dependencies(s) == expected
+
+
+def test_reading_stops_after_header():
+    s = (
+        '---- MODULE M ----\n'
+        'EXTENDS A\n'
+        'x == 1\n')
+    lines = iter(s.splitlines(True) + 1000 * ['y == 2\n'])
+    assert tla_depends._header_dependencies(lines) == ['A']
+    assert len(list(lines)) > 990
+
+
+def test_dependency_graph():
+    with tempfile.TemporaryDirectory() as d:
+        lib = os.path.join(d, 'lib')
+        os.makedirs(lib)
+        _write(os.path.join(d, 'M.tla'), (
+            '---- MODULE M ----\n'
+            'EXTENDS A, L, Naturals, Missing\n'
+            '====\n'))
+        _write(os.path.join(d, 'A.tla'), (
+            '---- MODULE A ----\n'
+            'H(x) == INSTANCE L\n'
+            '====\n'))
+        _write(os.path.join(lib, 'L.tla'), (
+            '---- MODULE L ----\n'
+            '====\n'))
+        g = tla_depends.dependency_graph(
+            os.path.join(d, 'M.tla'), search_path=[lib])
+        kinds = dict(g.nodes(data='kind'))
+        assert kinds == dict(
+            M='local', A='local', L='library',
+            Naturals='standard', Missing='missing'), kinds
+        assert set(g.edges) == {
+            ('M', 'A'), ('M', 'L'), ('M', 'Naturals'),
+            ('M', 'Missing'), ('A', 'L')}, g.edges
+
+
+def _write(fname, s):
+    with open(fname, 'w') as f:
+        f.write(s)
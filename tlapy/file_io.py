@@ -0,0 +1,115 @@
+"""Helpers for files and command lines shared by the tools.
+
+Files are replaced atomically: they are written to a temporary
+file in the same directory, which then replaces the file.
+Other processes and threads see either the old or the new file.
+"""
+import argparse
+import contextlib
+import hashlib
+import json
+import os
+import tempfile
+
+
+# permissions of new files, as `open` creates them
+_umask = os.umask(0)
+os.umask(_umask)
+FILE_MODE = 0o666 & ~_umask
+# files that `tree_files` finds in directories
+EXTENSIONS = ('.tla',)
+
+
+def file_digest(fname):
+    """Return SHA-256 digest of contents of file `fname`."""
+    h = hashlib.sha256()
+    with open(fname, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 16), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+@contextlib.contextmanager
+def atomic_open(fname, mode='w', file_mode=FILE_MODE):
+    """Yield file that atomically replaces `fname` when closed.
+
+    If an exception is raised, then `fname` is unchanged.
+
+    @param file_mode: permissions of `fname`
+    """
+    head, tail = os.path.split(fname)
+    fd, tmp = tempfile.mkstemp(
+        prefix=tail + '.', suffix='.tmp', dir=head or os.curdir)
+    try:
+        with os.fdopen(fd, mode) as f:
+            yield f
+        os.chmod(tmp, file_mode)
+        os.replace(tmp, fname)
+    finally:
+        if os.path.isfile(tmp):
+            os.remove(tmp)
+
+
+def write_file(fname, s, file_mode=FILE_MODE):
+    """Atomically replace file `fname` with string `s`."""
+    with atomic_open(fname, file_mode=file_mode) as f:
+        f.write(s)
+
+
+def load_json(fname):
+    """Return data stored in JSON file `fname`, or `None`."""
+    try:
+        with open(fname, 'r') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def dump_json(fname, data):
+    """Atomically write `data` to JSON file `fname`.
+
+    The directory of `fname` is created if needed.
+    """
+    head, _ = os.path.split(fname)
+    if head:
+        os.makedirs(head, exist_ok=True)
+    with atomic_open(fname) as f:
+        json.dump(data, f, indent=0, sort_keys=True)
+
+
+def tree_files(paths, extensions=EXTENSIONS):
+    """Yield files in `paths` and files with `extensions` below them.
+
+    Directories are walked in sorted order.
+    """
+    for path in paths:
+        if not os.path.isdir(path):
+            yield path
+            continue
+        for root, dirs, files in os.walk(path):
+            dirs.sort()
+            for fname in sorted(files):
+                if fname.endswith(extensions):
+                    yield os.path.join(root, fname)
+
+
+def add_jobs_argument(parser, help):
+    """Add option `-j/--jobs` to `parser`.
+
+    Without a value, the option is the number of CPUs.
+
+    @param help: what is done in parallel, for example
+        `'number of files to typeset in parallel'`
+    """
+    parser.add_argument(
+        '-j', '--jobs', type=_positive_int, nargs='?',
+        default=1, const=os.cpu_count(),
+        help='{h} (without a value: number of CPUs)'.format(h=help))
+
+
+def _positive_int(s):
+    """Return `int(s)`, if positive."""
+    n = int(s)
+    if n < 1:
+        raise argparse.ArgumentTypeError('must be positive')
+    return n
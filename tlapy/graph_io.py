@@ -0,0 +1,194 @@
+"""Write graphs as DOT, GraphML, or JSON lines, and render them.
+
+The writers stream the graph one node and edge at a time to a file,
+without building another graph in memory, and accept both
+`networkx.DiGraph` and `tlapy.proof_graph.CompactProofGraph`.
+Rendering to PDF, SVG, or PNG pipes DOT to the Graphviz `dot` program.
+"""
+# Copyright 2017-2020 by California Institute of Technology
+# All rights reserved. Licensed under 3-clause BSD.
+#
+import json
+import os
+import subprocess
+from xml.sax import saxutils
+
+from tlapy import file_io
+
+
+DOT = 'dot'  # Graphviz program used for rendering
+# file extension -> writer, for formats that need no rendering
+WRITERS = dict()
+# formats that `DOT` renders
+RENDERED_FORMATS = {'pdf', 'svg', 'png'}
+
+
+def dump_graph(g, filename):
+    """Write graph `g` to `filename`, in the format of its extension.
+
+    The extensions `.dot` and `.gv` write DOT, `.graphml` writes
+    GraphML, and `.jsonl` writes JSON lines, without invoking Graphviz.
+    The extensions `.pdf`, `.svg`, and `.png` render the graph
+    with `DOT`. The file is replaced atomically.
+    """
+    _, ext = os.path.splitext(filename)
+    fmt = ext[1:].lower()
+    if fmt in RENDERED_FORMATS:
+        render(g, filename, fmt)
+        return
+    writer = WRITERS.get(fmt)
+    if writer is None:
+        raise ValueError(
+            'unknown graph format: "{f}"'.format(f=filename))
+    with file_io.atomic_open(filename) as f:
+        writer(g, f)
+
+
+def render(g, filename, fmt='pdf'):
+    """Render graph `g` to `filename` using `DOT`.
+
+    DOT is written to the standard input of `DOT`, and its
+    standard output replaces `filename` atomically.
+    Raise `subprocess.CalledProcessError` if `DOT` fails,
+    and then `filename` is unchanged.
+    """
+    cmd = [DOT, '-T{fmt}'.format(fmt=fmt)]
+    with file_io.atomic_open(filename, 'wb') as f:
+        with subprocess.Popen(
+                cmd, stdin=subprocess.PIPE, stdout=f,
+                universal_newlines=True) as p:
+            try:
+                write_dot(g, p.stdin)
+            finally:
+                p.stdin.close()
+        if p.returncode != 0:
+            raise subprocess.CalledProcessError(p.returncode, cmd)
+
+
+def write_dot(g, f):
+    """Write graph `g` to file `f` in DOT format.
+
+    Node attributes with value `None` are omitted.
+    """
+    f.write('strict digraph {name} {{\n'.format(
+        name=_dot_id(_graph_name(g))))
+    for u, attrs in _nodes(g):
+        f.write('{u}{attrs};\n'.format(
+            u=_dot_id(u), attrs=_dot_attrs(attrs)))
+    for u, v, attrs in _edges(g):
+        f.write('{u} -> {v}{attrs};\n'.format(
+            u=_dot_id(u), v=_dot_id(v), attrs=_dot_attrs(attrs)))
+    f.write('}\n')
+
+
+def _dot_id(x):
+    """Return `x` as quoted DOT identifier."""
+    s = str(x).replace('\\', '\\\\').replace('"', '\\"')
+    return '"{s}"'.format(s=s)
+
+
+def _dot_attrs(attrs):
+    """Return DOT attribute list for `dict` `attrs`."""
+    s = ', '.join(
+        '{k}={v}'.format(k=_dot_id(k), v=_dot_id(v))
+        for k, v in attrs.items() if v is not None)
+    if not s:
+        return ''
+    return ' [{s}]'.format(s=s)
+
+
+def write_graphml(g, f):
+    """Write graph `g` to file `f` in GraphML format.
+
+    All attributes are written as strings.
+    Node attributes with value `None` are omitted.
+    """
+    # keys are declared before the graph,
+    # so node attributes are read twice
+    node_keys = sorted({k for _, attrs in _nodes(g) for k in attrs})
+    edge_keys = sorted({k for _, _, attrs in _edges(g) for k in attrs})
+    f.write(
+        '<?xml version="1.0" encoding="UTF-8"?>\n'
+        '<graphml xmlns="http://graphml.graphdrawing.org/xmlns">\n')
+    for domain, keys in (('node', node_keys), ('edge', edge_keys)):
+        for k in keys:
+            f.write(
+                '<key id={i} for="{d}" attr.name={k} '
+                'attr.type="string"/>\n'.format(
+                    i=_xml_attr(domain[0] + k), d=domain,
+                    k=_xml_attr(k)))
+    f.write('<graph id={name} edgedefault="directed">\n'.format(
+        name=_xml_attr(_graph_name(g))))
+    for u, attrs in _nodes(g):
+        f.write('<node id={u}>{data}</node>\n'.format(
+            u=_xml_attr(u), data=_xml_data('n', attrs)))
+    for u, v, attrs in _edges(g):
+        f.write('<edge source={u} target={v}>{data}</edge>\n'.format(
+            u=_xml_attr(u), v=_xml_attr(v), data=_xml_data('e', attrs)))
+    f.write('</graph>\n</graphml>\n')
+
+
+def _xml_attr(x):
+    """Return `x` as quoted XML attribute value."""
+    return saxutils.quoteattr(str(x))
+
+
+def _xml_data(prefix, attrs):
+    """Return GraphML `data` elements for `dict` `attrs`."""
+    return ''.join(
+        '<data key={k}>{v}</data>'.format(
+            k=_xml_attr(prefix + k), v=saxutils.escape(str(v)))
+        for k, v in attrs.items() if v is not None)
+
+
+def write_jsonl(g, f):
+    """Write graph `g` to file `f` as JSON lines.
+
+    The first line describes the graph, and each following line
+    a node or an edge, with all nodes before the edges:
+
+        {"graph": "Foo"}
+        {"node": "Thm", "attributes": {...}}
+        {"edge": ["Thm", 0], "attributes": {}}
+
+    Node names are written as JSON numbers or strings.
+    """
+    dumps = json.JSONEncoder(default=str).encode
+    f.write(dumps(dict(graph=_graph_name(g))) + '\n')
+    for u, attrs in _nodes(g):
+        f.write(dumps(dict(node=u, attributes=attrs)) + '\n')
+    for u, v, attrs in _edges(g):
+        f.write(dumps(dict(edge=[u, v], attributes=attrs)) + '\n')
+
+
+WRITERS.update(
+    dot=write_dot, gv=write_dot,
+    graphml=write_graphml, jsonl=write_jsonl)
+
+
+def _graph_name(g):
+    """Return name of module of graph `g`, or `''`."""
+    name = getattr(g, 'module_name', None)
+    if name is None:
+        name = getattr(g, 'name', '')
+    return name
+
+
+def _nodes(g):
+    """Yield nodes of graph `g`, each with its attributes."""
+    if hasattr(g, 'csr'):  # `CompactProofGraph`
+        for u in g:
+            yield u, g.node_attributes(u)
+    else:
+        yield from g.nodes(data=True)
+
+
+def _edges(g):
+    """Yield edges of graph `g`, each with its attributes."""
+    if hasattr(g, 'csr'):  # `CompactProofGraph`
+        indptr, indices = g.csr()
+        for i, u in enumerate(g):
+            for j in indices[indptr[i]:indptr[i + 1]]:
+                yield u, g.node_key(j), dict()
+    else:
+        yield from g.edges(data=True)
@@ -0,0 +1,154 @@
+"""Tokenize TLA+ source, one line at a time.
+
+The token kinds are:
+
+- `'comment'`: the part of a comment that is on one line,
+  for `\\*` comments and for nested `(* ... *)` comments
+- `'string'`: a string, with quotes
+- `'module'`: a module header, like `---- MODULE Foo ----`
+- `'rule'`: a horizontal rule, `----` or `====` or longer
+- `'step'`: a step name, like `<1>2.`, `<2>a`, `<2>`, or `<*>`
+- `'word'`: an identifier, keyword, or number
+- `'symbol'`: any other character, or one of `<<`, `>>`, `==`, `<-`
+
+Text before the first module and after the end of the last module
+is prose, which `tla2tex` typesets as a comment. With `prose=True`,
+each line of prose is a `'comment'` token.
+
+Whitespace is skipped. Each token records the line number
+(starting from 1) and the column (starting from 0) where it starts,
+so tools that rewrite lines can replace tokens using `str` slicing.
+"""
+import collections
+import mmap
+import os
+import re
+
+
+Token = collections.namedtuple(
+    'Token', ['kind', 'text', 'line', 'column'])
+TOKEN = re.compile(r'''
+      (?P<comment> \(\* | \\\* )
+    | (?P<string> " (?: [^"\\] | \\. )* "? )
+    | (?P<module> -{4,} [ \t]* MODULE [ \t]+ \w+ [ \t]* -{4,} )
+    | (?P<rule> -{4,} | ={4,} )
+    | (?P<step> < (?: \d+ | \* | \+ ) > \w* \.? )
+    | (?P<word> \w+ )
+    | (?P<symbol> << | >> | == | <- | \S )
+    ''', re.VERBOSE)
+COMMENT_DELIMITER = re.compile(r'\(\*|\*\)')
+MODULE_HEADER = re.compile(r'-{4,}[ \t]*MODULE[ \t]+\w+[ \t]*-{4,}')
+STEP_NAME = re.compile(r'<(?P<level>\d+|\*|\+)>(?P<label>\w*)')
+MODULE_NAME = re.compile(r'MODULE\s+(?P<name>\w+)')
+
+
+def tokenize(lines, prose=False):
+    """Yield tokens of `lines`, as `Token`.
+
+    @param lines: iterable of `str`, for example a file
+    @param prose: as for `tokenize_lines`
+    """
+    for _, tokens in tokenize_lines(lines, prose):
+        yield from tokens
+
+
+def tokenize_lines(lines, prose=False):
+    """Yield each line of `lines` with its tokens.
+
+    Lines are read only as far as the caller iterates,
+    so the header of a long module can be read alone.
+
+    @param lines: iterable of `str`, for example a file
+    @param prose: if `True`, then text outside modules
+        is returned as `'comment'` tokens, one per line.
+        Otherwise, `lines` are tokenized as a module body,
+        so that parts of modules can be tokenized.
+    @return: generator of pairs `(line, tokens)`,
+        where `tokens` is a `list` of `Token`
+    """
+    depth = 0  # nesting of comments
+    modules = 0  # nesting of modules
+    for n, line in enumerate(lines, 1):
+        end = len(line.rstrip('\r\n'))
+        tokens = list()
+        i = 0
+        if depth > 0:
+            i, depth = _comment_end(line, 0, end, depth)
+            tokens.append(Token('comment', line[:i], n, 0))
+        elif prose and modules == 0:
+            m = MODULE_HEADER.search(line, 0, end)
+            i = end if m is None else m.start()
+            _append_prose(tokens, line, 0, i, n)
+        while i < end:
+            m = TOKEN.search(line, i, end)
+            if m is None:
+                break
+            kind = m.lastgroup
+            start = m.start()
+            i = m.end()
+            if m.group() == '\\*':
+                i = end
+            elif m.group() == '(*':
+                i, depth = _comment_end(line, i, end, 1)
+            tokens.append(Token(kind, line[start:i], n, start))
+            if kind == 'module':
+                modules += 1
+            elif kind == 'rule' and m.group().startswith('=') and modules:
+                modules -= 1
+                if prose and modules == 0:
+                    _append_prose(tokens, line, i, end, n)
+                    i = end
+        yield line, tokens
+
+
+def _append_prose(tokens, line, start, end, n):
+    """Append `line[start:end]` to `tokens` as comment, unless blank."""
+    text = line[start:end]
+    s = text.lstrip()
+    if not s:
+        return
+    column = start + len(text) - len(s)
+    tokens.append(Token('comment', line[column:end], n, column))
+
+
+def _comment_end(line, i, end, depth):
+    """Return end of comment at nesting `depth`, and remaining depth.
+
+    The comment ends at the `*)` that closes it,
+    or at the end of `line`.
+    """
+    while depth > 0:
+        m = COMMENT_DELIMITER.search(line, i, end)
+        if m is None:
+            return end, depth
+        depth += 1 if m.group() == '(*' else -1
+        i = m.end()
+    return i, depth
+
+
+def read_lines(fname):
+    """Yield the lines of file `fname`, reading it through `mmap`.
+
+    Only the pages of the file that are read are loaded,
+    so reading stops early if the caller stops iterating.
+    """
+    with open(fname, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            for line in iter(mm.readline, b''):
+                yield line.decode('utf-8')
+
+
+def step_name(token):
+    """Return level and label of the step `token`.
+
+    For example, `('1', '2')` for `<1>2.`, and `('2', '')` for `<2>`.
+    """
+    m = STEP_NAME.match(token.text)
+    return m.group('level'), m.group('label')
+
+
+def module_name(token):
+    """Return the name of the module in the header `token`."""
+    return MODULE_NAME.search(token.text).group('name')
@@ -1,128 +1,432 @@
+#!/usr/bin/env python
 """Convert module theorem proofs to graph."""
 # Copyright 2017-2020 by California Institute of Technology
 # All rights reserved. Licensed under 3-clause BSD.
 #
+import argparse
+import array
+import collections
+import concurrent.futures
+import itertools
 import logging
+import os
+import re
 
 import networkx as nx
 
+from tlapy import file_io
+from tlapy import graph_io
+
 
 INDENT = 4 * ' '
+# name of a step that can be referred to, as `<1>2`
+NAMED_STEP = re.compile(r'<\d+>\w+')
 log = logging.getLogger(__name__)
 
 
-def proof_graph(module_tree, nodes):
+def main():
+    """Entry point."""
+    args = _parse_args()
+    report = proof_graphs(args.paths, args.jobs)
+    graphs = report['graphs']
+
+    def dump(fname):
+        g = graphs[fname]
+        if not g:
+            log.info('module %s has no proof steps.', g.module_name)
+            return None
+        filename = os.path.join(
+            args.outdir, 'proof_graph_{name}.{fmt}'.format(
+                name=g.module_name, fmt=args.format))
+        dump_proof_graph(g, filename, level=args.level)
+        return filename
+
+    with concurrent.futures.ThreadPoolExecutor(
+            max_workers=args.jobs) as executor:
+        for filename in executor.map(dump, graphs):
+            if filename is None:
+                continue
+            print('Dump proof graph to file "{f}"'.format(f=filename))
+    for fname, msg in report['failed'].items():
+        print('Failed to convert file "{f}": {msg}'.format(
+            f=fname, msg=msg))
+    if report['failed']:
+        raise SystemExit(1)
+
+
+def proof_graphs(paths, jobs=1):
+    """Return proof graphs of modules in `paths`.
+
+    Directories in `paths` are replaced by the `*.tla` files
+    below them. Modules are parsed and converted by `jobs`
+    processes, using `module_proof_graph`.
+
+    @return: `dict` with the graph of each file that was converted
+        (`'graphs'`), as `CompactProofGraph`, in the order of files,
+        and the error message for each file that could not be
+        converted (`'failed'`)
+    """
+    if jobs < 1:
+        raise ValueError(jobs)
+    # fail once, instead of once for each file
+    _import_tla()
+    files = list(file_io.tree_files(paths))
+    graphs = dict()
+    failed = dict()
+    if jobs == 1:
+        results = map(_try_module_proof_graph, files)
+        for fname, (g, msg) in zip(files, results):
+            _merge_result(fname, g, msg, graphs, failed)
+        return dict(graphs=graphs, failed=failed)
+    with concurrent.futures.ProcessPoolExecutor(
+            max_workers=jobs) as executor:
+        futures = [
+            executor.submit(module_proof_graph, fname)
+            for fname in files]
+        for fname, future in zip(files, futures):
+            try:
+                g, msg = future.result(), None
+            except Exception as e:
+                g, msg = None, _error_message(e)
+            _merge_result(fname, g, msg, graphs, failed)
+    return dict(graphs=graphs, failed=failed)
+
+
+def module_proof_graph(fname):
+    """Parse the module `fname`, and return its proof graph.
+
+    @rtype: `CompactProofGraph`
+    """
+    tla = _import_tla()
+    with open(fname, 'r') as f:
+        module_text = f.read()
+    try:
+        tree = tla.parse(module_text)
+    except ValueError as e:
+        raise ValueError(
+            'Cannot parse file: "{f}"'.format(f=fname)) from e
+    return proof_graph(tree, tla.make_nodes(), compact=True)
+
+
+def _import_tla():
+    """Return the package `tla`, which parses TLA+.
+
+    Raise `ImportError` if `tla` is missing, or if it
+    is older than the version that `setup.py` names.
+    """
+    try:
+        import tla
+    except ImportError as e:
+        raise ImportError(
+            '`tlapy.proof_graph` requires the package `tla` '
+            '(`pip install tlapy[proof_graph]`)') from e
+    if not hasattr(tla, 'make_nodes'):
+        raise ImportError(
+            '`tlapy.proof_graph` requires the package `tla` '
+            'version 0.0.4 or later')
+    return tla
+
+
+def _try_module_proof_graph(fname):
+    """Return `(graph, None)`, or `(None, message)` on error."""
+    try:
+        return module_proof_graph(fname), None
+    except Exception as e:
+        return None, _error_message(e)
+
+
+def _error_message(e):
+    return '{t}: {e}'.format(t=type(e).__name__, e=e)
+
+
+def _merge_result(fname, g, msg, graphs, failed):
+    """Add graph `g` of `fname` to `graphs`, or `msg` to `failed`."""
+    if g is None:
+        failed[fname] = msg
+    else:
+        graphs[fname] = g
+
+
+def proof_graph(module_tree, nodes, compact=False):
     """Return dependency graph of proof steps and theorems.
 
     The attribute `g.module_name` of the returned graph is
-    the name of the module.
+    the name of the module, and `g.theorems` is a `list` of
+    the names of theorems with nodes in the graph.
+    Each proof step node has the attributes `level` (of the proof)
+    and `theorem` (name of the theorem that the step proves).
 
-    @rtype: `networkx.DiGraph`
+    @param compact: if `True`, then return a `CompactProofGraph`,
+        which uses less memory for large modules
+    @rtype: `networkx.DiGraph` or `CompactProofGraph`
     """
     module_name = module_tree.name
     theorems = [
-        unit for unit in module_tree.body
+        unit for unit in module_tree.units
         if isinstance(unit, nodes.Theorem)]
-    g = nx.DiGraph()
+    if compact:
+        g = CompactProofGraph()
+    else:
+        g = nx.DiGraph()
+    thm_names = list()
     for i, thm in enumerate(theorems):
-        thm_name = _name_theorem(thm)
+        thm_name = _name_theorem(thm, i)
         # proof
-        proof = thm.proof
-        if not isinstance(proof, nodes.Omitted):
+        proof = _terminal_proof(thm.proof, nodes)
+        if not (proof is None or isinstance(proof, nodes.Omitted)):
             g.add_node(
                 thm_name,
                 style='filled', fillcolor='yellow')
+            thm_names.append(thm_name)
         if isinstance(proof, nodes.By):
             depends_on = _parse_by(proof, nodes)
             # no step names defined in this case,
             # only named facts
             for dep_name in depends_on:
                 g.add_edge(thm_name, dep_name)
-        elif isinstance(proof, nodes.Steps):
+        elif isinstance(proof, nodes.Proof):
             level = 1
             umap = dict()
             qed_nd_id = _traverse_steps(
-                proof, level, umap, g, nodes)
+                proof, level, umap, g, nodes, thm_name)
             g.add_edge(thm_name, qed_nd_id)
-        elif isinstance(proof,
+        elif proof is None or isinstance(proof,
                 (nodes.Obvious, nodes.Omitted)):
             pass
         else:
             raise ValueError(proof)
     g.module_name = module_name
+    g.theorems = thm_names
     return g
 
 
-def _name_theorem(theorem):
-    """Return name of theorem."""
+class CompactProofGraph:
+    """Proof graph with integer node ids and CSR adjacency.
+
+    Supports the methods of `networkx.DiGraph` that `proof_graph`
+    uses to build a graph. Each node key (theorem name, fact name,
+    or step number) is mapped to an integer id. Node attributes are
+    interned, so nodes with equal attributes share them. Edges are
+    stored in `array` buffers, and converted to compressed sparse
+    rows (`indptr`, `indices`) when first queried.
+
+    Use `to_networkx` to obtain a `networkx.DiGraph`.
+    """
+
+    def __init__(self):
+        self.module_name = None
+        self.theorems = list()
+        self._ids = dict()  # node key -> id
+        self._keys = list()  # id -> node key
+        # id -> index in `self._attrs`
+        self._attr_ids = array.array('l')
+        self._attrs = [tuple()]
+        self._attrs_index = {tuple(): 0}
+        # edges in order of addition
+        self._sources = array.array('l')
+        self._targets = array.array('l')
+        self._csr = None
+
+    def __len__(self):
+        return len(self._keys)
+
+    def __iter__(self):
+        return iter(self._keys)
+
+    def __contains__(self, key):
+        return key in self._ids
+
+    def add_node(self, key, **attrs):
+        """Add node `key`, updating its attributes with `attrs`."""
+        i = self._ids.get(key)
+        if i is None:
+            i = len(self._keys)
+            self._ids[key] = i
+            self._keys.append(key)
+            self._attr_ids.append(0)
+        if attrs:
+            old = dict(self._attrs[self._attr_ids[i]])
+            old.update(attrs)
+            self._attr_ids[i] = self._intern_attrs(old)
+        return i
+
+    def add_edge(self, u, v):
+        """Add edge from node `u` to node `v`, adding the nodes."""
+        self._sources.append(self.add_node(u))
+        self._targets.append(self.add_node(v))
+        self._csr = None
+
+    def _intern_attrs(self, attrs):
+        """Return index of `attrs` in `self._attrs`."""
+        t = tuple(sorted(attrs.items()))
+        i = self._attrs_index.get(t)
+        if i is None:
+            i = len(self._attrs)
+            self._attrs.append(t)
+            self._attrs_index[t] = i
+        return i
+
+    def node_id(self, key):
+        """Return integer id of node `key`."""
+        return self._ids[key]
+
+    def node_key(self, i):
+        """Return key of node with integer id `i`."""
+        return self._keys[i]
+
+    def node_attributes(self, key):
+        """Return `dict` of attributes of node `key`."""
+        return dict(self._attrs[self._attr_ids[self._ids[key]]])
+
+    def csr(self):
+        """Return adjacency as compressed sparse rows.
+
+        The successors of node id `i` are the ids
+        `indices[indptr[i]:indptr[i + 1]]`, in increasing order.
+
+        @return: `(indptr, indices)`, as `array.array`
+        """
+        if self._csr is None:
+            self._csr = self._build_csr()
+        return self._csr
+
+    def _build_csr(self):
+        n = len(self._keys)
+        counts = [0] * (n + 1)
+        for u in self._sources:
+            counts[u + 1] += 1
+        for i in range(n):
+            counts[i + 1] += counts[i]
+        rows = [None] * len(self._sources)
+        fill = counts[:n]
+        for u, v in zip(self._sources, self._targets):
+            rows[fill[u]] = v
+            fill[u] += 1
+        # remove repeated edges, as `networkx.DiGraph` does
+        indptr = array.array('l', [0])
+        indices = array.array('l')
+        for i in range(n):
+            indices.extend(sorted(set(rows[counts[i]:counts[i + 1]])))
+            indptr.append(len(indices))
+        return indptr, indices
+
+    def successors(self, key):
+        """Return `list` of successors of node `key`."""
+        indptr, indices = self.csr()
+        i = self._ids[key]
+        return [self._keys[j] for j in indices[indptr[i]:indptr[i + 1]]]
+
+    def number_of_edges(self):
+        """Return number of edges, without repetitions."""
+        _, indices = self.csr()
+        return len(indices)
+
+    def to_networkx(self):
+        """Return this graph as `networkx.DiGraph`."""
+        g = nx.DiGraph()
+        for key, a in zip(self._keys, self._attr_ids):
+            g.add_node(key, **dict(self._attrs[a]))
+        indptr, indices = self.csr()
+        keys = self._keys
+        for i, key in enumerate(keys):
+            g.add_edges_from(
+                (key, keys[j]) for j in indices[indptr[i]:indptr[i + 1]])
+        g.module_name = self.module_name
+        g.theorems = list(self.theorems)
+        return g
+
+
+def _name_theorem(theorem, i):
+    """Return name of theorem, the `i`-th in its module."""
     thm_name = theorem.name
     if thm_name is None:
         thm_name = 'UnnamedTheorem{i}'.format(i=i)
-    log.info('Theorem: {name}'.format(name=thm_name))
+    log.info('Theorem: %s', thm_name)
     return thm_name
 
 
-def _traverse_steps(steps, level, umap, g, nodes):
-    """Recursively extend proof graph `g` with steps."""
-    for step in steps.steps:
-        nd_id = _traverse_step(
-            step, level, umap, g, nodes)
-    qed_nd_id = _traverse_step(
-        steps.qed_step, level, umap, g, nodes)
-    return qed_nd_id
-
-
-def _traverse_step(step, level, umap, g, nodes):
-    """Recursively extend proof graph `g` with step."""
-    nd_id = len(g)  # new node in the graph
-    ref_name = _step_number_to_str(
-        step, nd_id, nodes)
-    umap[ref_name] = nd_id
-    # add node to graph `g`
-    label = _label_node(ref_name)
-    g.add_node(nd_id, label=label)
-    # proof
-    _traverse_proof(step, nd_id, level, umap, g, nodes)
-    _log_proof_level(level, ref_name)
+def _traverse_steps(steps, level, umap, g, nodes, thm_name=None):
+    """Extend proof graph `g` with `steps`, and their proofs.
+
+    The proof tree is traversed using an explicit stack,
+    so proofs can be nested arbitrarily deep.
+
+    @param umap: `dict` that maps step names to nodes
+    @return: node of the QED step of `steps`
+    """
+    verbose = log.isEnabledFor(logging.INFO)
+    # each frame is the node and name of a step,
+    # the level of its proof, and the steps of its proof
+    stack = [(None, None, level, _proof_steps(steps))]
+    nd_id = None  # node of step traversed last
+    while stack:
+        parent, parent_name, level, steps_ = stack[-1]
+        step = next(steps_, None)
+        if step is None:
+            # the proof of `parent` ends with step `nd_id`
+            stack.pop()
+            if parent is None:
+                continue
+            g.add_edge(parent, nd_id)
+            if verbose:
+                _log_proof_level(level - 1, parent_name)
+            nd_id = parent
+            continue
+        nd_id = len(g)  # new node in the graph
+        ref_name = _step_number_to_str(step, nd_id)
+        umap[ref_name] = nd_id
+        # add node to graph `g`
+        label = _label_node(ref_name)
+        g.add_node(
+            nd_id, label=label, level=level, theorem=thm_name)
+        # proof
+        proof = _terminal_proof(step.proof, nodes)
+        if isinstance(proof, nodes.Proof):
+            stack.append(
+                (nd_id, ref_name, level + 1, _proof_steps(proof)))
+            continue
+        elif isinstance(proof, nodes.By):
+            depends_on = _parse_by(proof, nodes)
+            for dep_name in depends_on:
+                dep_nd_id = umap.get(dep_name, dep_name)
+                g.add_edge(nd_id, dep_nd_id)
+        elif proof is None or isinstance(proof,
+                (nodes.Obvious, nodes.Omitted)):
+            pass
+        else:
+            raise ValueError(proof)
+        if verbose:
+            _log_proof_level(level, ref_name)
     return nd_id
 
 
-def _traverse_proof(step, nd_id, level, umap, g, nodes):
-    """Recursively extend proof graph `g` with proof."""
-    if not hasattr(step, 'proof'):
-        return
-    proof = step.proof
-    if isinstance(proof, nodes.Steps):
-        level_ = level + 1
-        pf_qed = _traverse_steps(
-            proof, level_, umap, g, nodes)
-        g.add_edge(nd_id, pf_qed)
-    elif isinstance(proof, nodes.By):
-        depends_on = _parse_by(proof, nodes)
-        for dep_name in depends_on:
-            dep_nd_id = umap.get(dep_name, dep_name)
-            g.add_edge(nd_id, dep_nd_id)
-    elif isinstance(proof,
-            (nodes.Obvious, nodes.Omitted)):
-        pass
-    else:
-        raise ValueError(proof)
+def _terminal_proof(proof, nodes):
+    """Return `proof`, or its `By`, `Obvious`, or `Omitted`.
 
+    A proof without steps can be parsed as a `Proof`
+    with one item, which is returned.
+    """
+    if (isinstance(proof, nodes.Proof) and len(proof.steps) == 1 and
+            not isinstance(proof.steps[0], nodes.ProofStep)):
+        return proof.steps[0]
+    return proof
+
+
+def _proof_steps(proof):
+    """Return iterator over steps of `proof`, ending with the QED step."""
+    return iter(proof.steps)
 
-def _step_number_to_str(step, nd_id, nodes):
+
+def _step_number_to_str(step, nd_id):
     """Return step number as `str`."""
-    step_no = step.step_number
-    if isinstance(step, nodes.Qed):
+    step_no = step.name.rstrip('.')
+    if step.main == 'QED':
         ref_name = '$Qed_{i}'.format(i=nd_id)
-    elif isinstance(step_no, nodes.Unnamed):
+    elif NAMED_STEP.fullmatch(step_no):
+        ref_name = step_no
+    else:
         ref_name = 'unnamed_step_{i}'.format(
             i=nd_id)
-    elif isinstance(step_no, nodes.Named):
-        ref_name = step_no.to_str(width=80)
-        if ref_name.endswith('.'):
-            ref_name = ref_name[:-1]
-    else:
-        raise ValueError(step, step_no)
     return ref_name
 
 
@@ -138,38 +442,215 @@ def _label_node(ref_name):
 def _parse_by(by, nodes):
     """Return `list` of names in facts."""
     depends_on = list()
-    for fact in by.usable['facts']:
-        if isinstance(fact, nodes.Opaque):
-            ref_name = fact.name
-            depends_on.append(ref_name)
+    for fact in by.facts or list():
+        # names of facts and steps, as `L` and `<1>2`
+        if (isinstance(fact, nodes.OperatorApplication) and
+                fact.arguments is None):
+            depends_on.append(fact.operator)
     return depends_on
 
 
 def _log_proof_level(level, ref_name):
     """Log message about proof graph node."""
-    expr = (
-        '{indent}{ref} '
-        '(at proof level {level})').format(
-            indent=level * INDENT,
-            ref=ref_name,
-            level=level)
-    log.info(expr)
+    log.info(
+        '%s%s (at proof level %s)',
+        level * INDENT, ref_name, level)
+
+
+def collapse_subproofs(g, level):
+    """Return graph with each subproof below `level` as one node.
+
+    The steps at levels greater than `level` are merged into the
+    step at `level` whose proof they are in, or into the theorem
+    if `level` is 0. Edges are merged accordingly, without
+    self-loops. The label of each step with merged steps
+    ends with the number of merged steps.
+
+    @type g: `networkx.DiGraph` or `CompactProofGraph`,
+        as returned by `proof_graph`
+    @type level: `int` >= 0
+    @rtype: `networkx.DiGraph`
+    """
+    if level < 0:
+        raise ValueError(level)
+    g = _to_networkx(g)
+    # steps are numbered in preorder, so the step at `level`
+    # that a deeper step is in is the last step at `level`
+    steps = sorted(u for u, d in g.nodes(data=True) if 'level' in d)
+    merged = dict()  # step -> node that it is merged into
+    counts = collections.Counter()
+    parent = None
+    for u in steps:
+        d = g.nodes[u]
+        if d['level'] == level:
+            parent = u
+        elif d['level'] > level:
+            v = parent if level > 0 else d['theorem']
+            merged[u] = v
+            counts[v] += 1
+    h = nx.DiGraph()
+    h.add_nodes_from(
+        (u, d) for u, d in g.nodes(data=True) if u not in merged)
+    for u, n in counts.items():
+        d = h.nodes[u]
+        d['label'] = '{label} (+{n} steps)'.format(
+            label=d.get('label', u), n=n)
+    for u, v in g.edges():
+        u = merged.get(u, u)
+        v = merged.get(v, v)
+        if u != v:
+            h.add_edge(u, v)
+    _copy_graph_attributes(g, h)
+    return h
 
 
-def dump_proof_graph(g, filename=None):
-    """Dump graph `g` as PDF file.
+def select_theorems(g, theorems, hops=0):
+    """Return subgraph of the proofs of `theorems`.
 
-    @type g: `networkx.DiGraph`
+    The subgraph contains the node of each theorem, the steps
+    of its proof, and the nodes within `hops` edges of these,
+    in either direction.
+
+    @type g: `networkx.DiGraph` or `CompactProofGraph`,
+        as returned by `proof_graph`
+    @param theorems: names of theorems
+    @type hops: `int` >= 0
+    @rtype: `networkx.DiGraph`
+    """
+    if hops < 0:
+        raise ValueError(hops)
+    g = _to_networkx(g)
+    names = set(theorems)
+    missing = [name for name in names if name not in g]
+    if missing:
+        raise ValueError(
+            'No theorems named: {names}'.format(names=missing))
+    selected = {
+        u for u, d in g.nodes(data=True)
+        if u in names or d.get('theorem') in names}
+    frontier = selected
+    for _ in range(hops):
+        frontier = {
+            v for u in frontier
+            for v in itertools.chain(
+                g.successors(u), g.predecessors(u))}
+        frontier -= selected
+        selected |= frontier
+    h = g.subgraph(selected).copy()
+    _copy_graph_attributes(g, h)
+    return h
+
+
+def dump_theorem_graphs(
+        g, theorems=None, outdir='.', fmt='pdf',
+        level=None, hops=0, jobs=1):
+    """Dump the proof of each theorem to a separate file.
+
+    The files are named `proof_graph_MODULE_THEOREM.FMT`,
+    and are rendered by `jobs` threads.
+
+    @type g: `networkx.DiGraph` or `CompactProofGraph`,
+        as returned by `proof_graph`
+    @param theorems: names of theorems,
+        by default `g.theorems`
+    @param fmt: file extension, as for `graph_io.dump_graph`
+    @param level: if not `None`, then collapse subproofs
+        below `level`, using `collapse_subproofs`
+    @param hops: as for `select_theorems`
+    @return: names of files written, in the order of `theorems`
+    @rtype: `list` of `str`
+    """
+    if jobs < 1:
+        raise ValueError(jobs)
+    if theorems is None:
+        theorems = g.theorems
+    if level is not None:
+        g = collapse_subproofs(g, level)
+    else:
+        g = _to_networkx(g)
+
+    def dump(thm_name):
+        filename = os.path.join(
+            outdir, 'proof_graph_{name}_{thm}.{fmt}'.format(
+                name=g.module_name, thm=thm_name, fmt=fmt))
+        h = select_theorems(g, [thm_name], hops)
+        graph_io.dump_graph(h, filename)
+        return filename
+
+    with concurrent.futures.ThreadPoolExecutor(
+            max_workers=jobs) as executor:
+        return list(executor.map(dump, theorems))
+
+
+def _to_networkx(g):
+    """Return `g` as `networkx.DiGraph`."""
+    if isinstance(g, CompactProofGraph):
+        return g.to_networkx()
+    return g
+
+
+def _copy_graph_attributes(g, h):
+    """Copy module name and theorems of graph `g` to graph `h`."""
+    h.module_name = g.module_name
+    h.theorems = [
+        name for name in getattr(g, 'theorems', list())
+        if name in h]
+
+
+def dump_proof_graph(
+        g, filename=None, theorems=None, level=None, hops=0):
+    """Dump graph `g` to file, by default as PDF.
+
+    The format is chosen by the extension of `filename`,
+    as described in `tlapy.graph_io.dump_graph`. Use `.dot`,
+    `.graphml`, or `.jsonl` to skip rendering with Graphviz.
+
+    @type g: `networkx.DiGraph` or `CompactProofGraph`
         with attribute `g.module_name`
     @type filename: `str`
+    @param theorems: if not `None`, then dump only the proofs
+        of these theorems, as selected by `select_theorems`
+    @param level: if not `None`, then collapse subproofs
+        below `level`, using `collapse_subproofs`
+    @param hops: as for `select_theorems`
     """
     module_name = g.module_name
     if not g:
-        log.info('module {name} has no proof steps.'.format(
-            name=module_name))
+        log.info('module %s has no proof steps.', module_name)
         return
     if filename is None:
         filename = 'proof_graph_{name}.pdf'.format(
             name=module_name)
-    pd = nx.drawing.nx_pydot.to_pydot(g)
-    pd.write_pdf(filename)
+    if level is not None:
+        g = collapse_subproofs(g, level)
+    if theorems is not None:
+        g = select_theorems(g, theorems, hops)
+    graph_io.dump_graph(g, filename)
+
+
+def _parse_args():
+    """Return arguments from command line."""
+    p = argparse.ArgumentParser(
+        description='Dump the proof graphs of TLA+ modules.')
+    p.add_argument('paths', nargs='+', type=str,
+                   help='`*.tla` files, or directories with '
+                        '`*.tla` files')
+    p.add_argument('-o', '--outdir', type=str, default='.',
+                   help='output directory')
+    p.add_argument('-f', '--format', type=str, default='pdf',
+                   choices=sorted(
+                       graph_io.RENDERED_FORMATS | set(graph_io.WRITERS)),
+                   help='output format (default: pdf)')
+    p.add_argument('--level', type=int,
+                   help='collapse subproofs below this proof level')
+    file_io.add_jobs_argument(
+        p, 'number of modules to process in parallel')
+    args = p.parse_args()
+    if args.level is not None and args.level < 0:
+        p.error('`--level` must be nonnegative')
+    os.makedirs(args.outdir, exist_ok=True)
+    return args
+
+
+if __name__ == '__main__':
+    main()
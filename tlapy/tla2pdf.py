@@ -4,67 +4,246 @@
 # All rights reserved. Licensed under 3-clause BSD.
 #
 import argparse
-import datetime
+import collections
+import concurrent.futures
+import hashlib
+import json
 import logging
 import os
 import subprocess
 
+from tlapy import file_io
+
 
 AUX_DIR = '__tlacache__/.aux'
+MANIFEST_FILE = '__tlacache__/tla2pdf_manifest.json'
 TLA2TEX = 'tla2tex'
 log = logging.getLogger(__name__)
+# `returncode` is `None` for skipped and cancelled jobs
+TypesetResult = collections.namedtuple(
+    'TypesetResult',
+    ['tlafile', 'status', 'returncode', 'stdout', 'stderr'])
+
+
+def typeset_tla_files(
+        files, tla2tex_options, jobs=1, keep_going=False):
+    """Typeset TLA+ files as PDFs, running `jobs` at a time.
+
+    If `jobs > 1`, then the output of each `tla2tex` process
+    is captured and printed after the process terminates,
+    in the order of `files`.
+
+    @param keep_going: if `False`, then cancel the jobs
+        that have not started when a job fails
+    @return: `list` of `TypesetResult`, in the order of `files`
+    """
+    if jobs < 1:
+        raise ValueError(jobs)
+    capture = jobs > 1
+    manifest = _load_manifest()
+    try:
+        with concurrent.futures.ThreadPoolExecutor(
+                max_workers=jobs) as executor:
+            futures = [
+                executor.submit(
+                    call_tla2tex, tlafile, tla2tex_options,
+                    capture, manifest)
+                for tlafile in files]
+            if not keep_going:
+                _cancel_on_failure(futures)
+            results = list()
+            for tlafile, future in zip(files, futures):
+                r = _job_result(tlafile, future)
+                _report_result(r)
+                results.append(r)
+    finally:
+        _dump_manifest(manifest)
+    failed = [r.tlafile for r in results if r.status == 'failed']
+    if failed:
+        raise RuntimeError(
+            '`{tla2tex}` failed for files: {fs}'.format(
+                tla2tex=TLA2TEX, fs=failed))
+    return results
+
+
+def _cancel_on_failure(futures):
+    """Cancel pending `futures` when any of them fails."""
+    def cancel_pending(future):
+        if future.cancelled():
+            return
+        if (future.exception() is None and
+                future.result().status != 'failed'):
+            return
+        for other in futures:
+            other.cancel()
+    for future in futures:
+        future.add_done_callback(cancel_pending)
+
+
+def _job_result(tlafile, future):
+    """Return `TypesetResult` of `future`, after it is done."""
+    if future.cancelled():
+        return TypesetResult(tlafile, 'cancelled', None, '', '')
+    exc = future.exception()
+    if exc is not None:
+        return TypesetResult(tlafile, 'failed', None, '', str(exc))
+    return future.result()
+
+
+def _report_result(r):
+    """Print captured output and status of typesetting job."""
+    if r.stdout:
+        print(r.stdout, end='')
+    if r.stderr:
+        print(r.stderr, end='')
+    if r.status == 'failed':
+        print('Typesetting file "{f}" failed (exit status {r}).'.format(
+            f=r.tlafile, r=r.returncode))
+    elif r.status == 'cancelled':
+        print('Cancelled typesetting file "{f}".'.format(f=r.tlafile))
 
 
-def typeset_tla_files(files, tla2tex_options):
-    """Typeset TLA+ files in `dirpath` as PDFs."""
-    for tlafile in files:
-        call_tla2tex(tlafile, tla2tex_options)
+def call_tla2tex(tlafile, options, capture=False, manifest=None):
+    """Typeset `tlafile` using `TLA2TEX`.
 
+    Typesetting is skipped if the PDF file exists, and was
+    created from the same source, options, and style file,
+    as recorded in `manifest`.
 
-def call_tla2tex(tlafile, options):
-    """Typeset `tlafile` using `TLA2TEX`."""
+    @param capture: if `True`, then return the output of `TLA2TEX`,
+        instead of printing it
+    @param manifest: build manifest, as returned by `_load_manifest`.
+        If `None`, then `MANIFEST_FILE` is loaded and updated.
+    @rtype: `TypesetResult`
+    """
+    if manifest is None:
+        manifest = _load_manifest()
+        try:
+            return call_tla2tex(tlafile, options, capture, manifest)
+        finally:
+            _dump_manifest(manifest)
     base, ext = os.path.splitext(tlafile)
     assert ext == '.tla', tlafile
     pdf = base + '.pdf'
-    if _is_newer(pdf, tlafile):
-        print((
+    entry = _build_entry(tlafile, options, manifest)
+    if _is_built(pdf, tlafile, entry, manifest):
+        msg = (
             'Skip "{tla}", because PDF file "{pdf}" '
-            'is newer.').format(
-                pdf=pdf, tla=tlafile))
-        return
-    if not os.path.isdir(AUX_DIR):
-        os.makedirs(AUX_DIR)
-    print('\nTypesetting file "{f}"'.format(f=tlafile))
+            'is up to date.').format(
+                pdf=pdf, tla=tlafile)
+        if capture:
+            return TypesetResult(
+                tlafile, 'skipped', None, msg + '\n', '')
+        print(msg)
+        return TypesetResult(tlafile, 'skipped', None, '', '')
+    os.makedirs(AUX_DIR, exist_ok=True)
+    msg = '\nTypesetting file "{f}"'.format(f=tlafile)
     cmd = [TLA2TEX, '-shade', *options, tlafile]
-    r = subprocess.call(cmd)
-    assert r == 0, r
+    if capture:
+        r = subprocess.run(
+            cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+            universal_newlines=True)
+        stdout = msg + '\n' + r.stdout
+        stderr = r.stderr
+    else:
+        print(msg)
+        r = subprocess.run(cmd)
+        stdout = ''
+        stderr = ''
+    status = 'failed' if r.returncode != 0 else 'done'
+    if status == 'done':
+        # a single `dict` assignment is atomic,
+        # so jobs in other threads see either entry
+        manifest['files'][tlafile] = entry
+    return TypesetResult(
+        tlafile, status, r.returncode, stdout, stderr)
 
 
-def _is_newer(target, source):
-    """Return `True` if `target` newer than `source` file."""
-    assert os.path.isfile(source), source
-    if not os.path.isfile(target):
+def _load_manifest():
+    """Return build manifest from `MANIFEST_FILE`.
+
+    The manifest maps each `*.tla` file to the source digest and
+    build key of the PDF last typeset from it. The file size and
+    modification time are recorded too, so that unchanged files
+    need not be hashed again. Modification times serve only to
+    avoid hashing, and never to decide that a PDF is up to date.
+    """
+    manifest = file_io.load_json(MANIFEST_FILE) or dict()
+    manifest.setdefault('files', dict())
+    # style digests are recomputed once per run
+    manifest['options'] = dict()
+    return manifest
+
+
+def _dump_manifest(manifest):
+    """Atomically write `manifest` to `MANIFEST_FILE`."""
+    file_io.dump_json(MANIFEST_FILE, dict(files=manifest['files']))
+
+
+def _build_entry(tlafile, options, manifest):
+    """Return manifest entry for typesetting `tlafile`."""
+    st = os.stat(tlafile)
+    old = manifest['files'].get(tlafile)
+    if (old is not None and
+            old['size'] == st.st_size and
+            old['mtime_ns'] == st.st_mtime_ns):
+        digest = old['digest']
+    else:
+        digest = file_io.file_digest(tlafile)
+    options_digest = _options_digest(options, manifest)
+    key = hashlib.sha256(
+        (digest + options_digest).encode()).hexdigest()
+    return dict(
+        size=st.st_size, mtime_ns=st.st_mtime_ns,
+        digest=digest, key=key)
+
+
+def _is_built(pdf, tlafile, entry, manifest):
+    """Return `True` if `pdf` was typeset as described by `entry`."""
+    old = manifest['files'].get(tlafile)
+    if old is None or not os.path.isfile(pdf):
+        return False
+    if old['key'] != entry['key']:
+        log.info('build key of "{f}" changed'.format(f=tlafile))
         return False
-    t_src = os.stat(source)[8]
-    t_tgt = os.stat(target)[8]
-    _print_dates(source, target, t_src, t_tgt)
-    return t_src < t_tgt
+    # record the new size and modification time
+    manifest['files'][tlafile] = entry
+    return True
+
+
+def options_digest(options):
+    """Return digest of `options` and the style file they name.
+
+    @param options: options for `TLA2TEX`
+    """
+    h = hashlib.sha256(json.dumps(options).encode())
+    style = _style_file(options)
+    if style is not None:
+        h.update(file_io.file_digest(style).encode())
+    return h.hexdigest()
 
 
-def _print_dates(source, target, t_src, t_tgt):
-    s = _format_time(t_src)
-    t = _format_time(t_tgt)
-    log.info((
-        'last modification dates:\n'
-        '    Source ({source}): {s}\n'
-        '    Target ({target}): {t}').format(
-            source=source, target=target,
-            s=s, t=t))
+def _options_digest(options, manifest):
+    """Return `options_digest(options)`, once per run."""
+    k = json.dumps(options)
+    cache = manifest['options']
+    if k not in cache:
+        cache[k] = options_digest(options)
+    return cache[k]
 
 
-def _format_time(t):
-    """Return time readable by humans."""
-    return datetime.datetime.fromtimestamp(t)
+def _style_file(options):
+    """Return path of style file given to `tla2tex`, if any."""
+    if '-style' not in options:
+        return None
+    i = options.index('-style')
+    if i + 1 >= len(options):
+        return None
+    style = options[i + 1]
+    for path in (style, style + '.sty'):
+        if os.path.isfile(path):
+            return path
+    return None
 
 
 def _parse_args():
@@ -78,17 +257,22 @@ def _parse_args():
 		-style $HOME/path/tlatex.sty \
 		-i *.tla
     ''')
+    file_io.add_jobs_argument(
+        p, 'number of files to typeset in parallel')
+    p.add_argument('-k', '--keep-going', action='store_true',
+                   help='continue typesetting the remaining files '
+                        'after a failure')
     args, unknown = p.parse_known_args()
     files = args.input
     tla2tex_options = unknown  # assume `tla2tex` knows other args
     log.info('input files: {fs}'.format(fs=files))
     log.info('options for `tla2tex.TeX`: {opt}'.format(
         opt=tla2tex_options))
-    return files, tla2tex_options
+    return files, tla2tex_options, args.jobs, args.keep_going
 
 
 if __name__ == '__main__':
     # log.addHandler(logging.StreamHandler())
     # log.setLevel(logging.DEBUG)
-    files, tla2tex_options = _parse_args()
-    typeset_tla_files(files, tla2tex_options)
+    files, tla2tex_options, jobs, keep_going = _parse_args()
+    typeset_tla_files(files, tla2tex_options, jobs, keep_going)
@@ -6,12 +6,44 @@ in the directory where you compile your LaTeX document.
 
 Each `tla` environment is dumped to a file that is named using the
 MD5 hash of environment's contents. If the contents remain the same,
-then `tla2tex.TeX` is not called again.
-
-Garbage collection is implemented by pickling lists of file names,
-and removing unused files when called with the option `--remove-outdated`.
-The option `--only-included` preserves files used by LaTeX files that
-are absent from the `\includeonly` command.
+then `tla2tex.TeX` is not called again. For this purpose, the digest
+of each input file, the preamble `tex/preamble.tex`, `SKIP`, and the
+tool version is recorded for the output file.
+The tool version is the digest of the script `tlaenv` found in `PATH`
+and of the `*.jar` files in `CLASSPATH`, so upgrading `tla2tex`
+invalidates the outputs. The environment variable `TLA2TEX_VERSION`,
+if set, overrides the tool version.
+
+If the environment variable `TLA2TEX_CACHE` names a directory, then outputs
+are also stored there, in files named by the digest of their input. This
+shared cache is searched before calling `tla2tex.TeX`, so identical
+environments are converted once across working directories. Files are
+added to it atomically, so several processes can use it at the same time.
+
+Several environments can be converted with a single call of `tla2tex.TeX`,
+by passing several input and output files, or a manifest file with an
+input and an output file name on each line.
+
+The output files are recorded in an SQLite database (in WAL mode, so that
+several processes can update it), together with their size and the time
+they were last used. When called with the option `--remove-outdated`,
+the files that were not used for `--max-age` days are removed, and then
+the least recently used files, until at most `--max-entries` files remain,
+of total size at most `--max-bytes`.
+
+Each call of `tla2tex.TeX` runs in its own temporary directory
+inside `CACHE_DIR`, which is removed after the conversion. If the
+conversion fails, then the LaTeX log is kept next to that directory.
+Directories and logs left by earlier runs are removed by `--remove-outdated`
+once they are older than `STALE_WORKDIR_AGE`.
+
+Calling this script with the option `--serve` starts a server that
+listens on the Unix socket `SOCKET_FILE`, and keeps the memoization index
+in memory. While the server runs, other calls of this script send their
+arguments to the server, instead of converting themselves, so each
+environment costs only the startup of a small client.
+If no server is running, then the script converts by itself.
+The server stops on `SIGINT` or `SIGTERM`.
 
 Assumption: The LaTeX document does not include any file named `undefined.tex`.
 """
@@ -19,12 +51,23 @@ Assumption: The LaTeX document does not include any file named `undefined.tex`.
 # All rights reserved. Licensed under 3-clause BSD.
 #
 import argparse
-import filecmp
+import contextlib
+import hashlib
+import json
 import logging
 import os
 import pickle
 import shutil
+import signal
+import socket
+import socketserver
+import sqlite3
 import subprocess
+import sys
+import tempfile
+import time
+
+from tlapy import file_io
 
 
 TLAENV = 'tlaenv'
@@ -32,93 +75,417 @@ log = logging.getLogger(__name__)
 template = '''\
 \\input{{tex/preamble}}
 \\begin{{document}}
+{envs}\\end{{document}}
+'''
+env_template = '''\
 \\begin{{tla}}
 {spec}
 \\end{{tla}}
-\\end{{document}}
+
 '''
 SKIP = 2  # [pt] whitespace above and below each environment
+PREAMBLE = 'tex/preamble.tex'
+TOOL_VERSION_VAR = 'TLA2TEX_VERSION'
+# increment when the output files change
+FORMAT_VERSION = 1
 CACHE_DIR = '__tlacache__/.tla2tex'
+# directory of cache shared by working directories
+SHARED_CACHE_VAR = 'TLA2TEX_CACHE'
+FILE_MODE = 0o644
+INDEX_FILE = 'memoization.sqlite'
+# output file name, digest of input, size in bytes,
+# and time of last use in seconds since the epoch
+INDEX_TABLES = [
+    '''CREATE TABLE IF NOT EXISTS entries (
+        name TEXT PRIMARY KEY, digest TEXT,
+        size INTEGER, last_used REAL)''',
+    '''CREATE INDEX IF NOT EXISTS entries_last_used
+        ON entries (last_used)''']
+# default limits for garbage collection
+MAX_AGE = 90  # days
+MAX_ENTRIES = 10000
+MAX_BYTES = 100 * 2**20
+# prefix of temporary directories of conversions
+WORKDIR_PREFIX = 'tla2tex_'
+STALE_WORKDIR_AGE = 24 * 3600  # seconds
+# files used before `INDEX_FILE`
 MEMO_FILE = 'memoization_file_names.pickle'
 OLD_MEMO_FILE = 'memoization_file_names_old.pickle'
 MEMO_INCLUDEONLY = os.path.join(CACHE_DIR, 'included.pickle')
+SOCKET_FILE = os.path.join(CACHE_DIR, 'server.sock')
+# environment variables of the client that the server uses
+CLIENT_VARS = [TOOL_VERSION_VAR, SHARED_CACHE_VAR]
+# digests of files of `tla2tex`,
+# as `(path, size, modification time) -> digest`
+_tool_digests = dict()
 
 
 def main():
     """Entry point."""
     os.makedirs(CACHE_DIR, exist_ok=True)
     # args
-    fname = 'tla2tex_input.tex'
-    fin, fout, clean, fnames = _parse_args()
-    if clean:
-        _collect_garbage(fnames)
-        return
-    # memoization file
-    base, _ = os.path.splitext(fout)
-    old = '{base}_old.tla'.format(base=base)
-    if _is_unchanged(fin, fout, old):
-        _record_file_name(fout, old)
+    argv = sys.argv[1:]
+    pairs, clean, limits, server = _parse_args(argv)
+    if server:
+        serve()
         return
-    with open(fin, 'r') as f:
-        s = f.read()
-    call_tla2tex(s, fname)
-    lines = _load_tex(fname)
-    _dump_tex(lines, fout)
-    # update the copy, after successful conversion
-    shutil.copy(fin, old)
-    _record_file_name(fout, old)
+    response = request(argv)
+    if response is None:
+        _run(pairs, clean, limits)
+    elif response['error'] is not None:
+        print(response['error'], file=sys.stderr)
+        sys.exit(1)
 
 
-def _record_file_name(fout, old):
-    memo, old_memo = _memo_file_names()
-    if os.path.isfile(memo):
-        with open(memo, 'rb') as f:
-            p = pickle.load(f)
+def _run(pairs, clean, limits, memo=None):
+    """Convert `pairs`, or collect garbage if `clean`."""
+    if clean:
+        _collect_garbage(**limits)
+        if memo is not None:
+            memo.clear()
+            memo.update(_load_memo())
+        return
+    convert(pairs, memo=memo)
+
+
+def serve(fname=SOCKET_FILE):
+    """Convert environments for clients of the Unix socket `fname`.
+
+    Requests are served one at a time, in the current directory.
+    """
+    if os.path.exists(fname):
+        if request(None, fname) is not None:
+            raise RuntimeError(
+                'A server is already listening on `{f}`.'.format(f=fname))
+        os.remove(fname)  # from a server that did not stop cleanly
+    signal.signal(signal.SIGTERM, _exit)
+    with socketserver.UnixStreamServer(fname, _RequestHandler) as server:
+        server.cwd = os.path.realpath(os.getcwd())
+        server.memo = _load_memo()
+        print('Listening on `{f}`.'.format(f=fname))
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            os.remove(fname)
+
+
+def _exit(signum, frame):
+    """Stop the server."""
+    sys.exit(0)
+
+
+class _RequestHandler(socketserver.StreamRequestHandler):
+    """Convert environments for a client.
+
+    A request is a line with a JSON object that contains the
+    arguments of the client (`argv`), its current directory (`cwd`),
+    and its values of the variables `CLIENT_VARS` (`env`).
+    An empty object is a request to check that the server runs.
+
+    The response is a line with a JSON object that contains
+    an error message or `None` (`error`). The server and the client
+    run in the same directory, so the server writes the output files.
+    """
+
+    def handle(self):
+        line = self.rfile.readline()
+        try:
+            self._convert(json.loads(line.decode()))
+            response = dict(error=None)
+        except Exception as e:
+            log.exception('Failed to serve request.')
+            response = dict(
+                error='{t}: {e}'.format(t=type(e).__name__, e=e))
+        self.wfile.write((json.dumps(response) + '\n').encode())
+
+    def _convert(self, req):
+        """Serve request `req`."""
+        if not req:
+            return
+        if os.path.realpath(req['cwd']) != self.server.cwd:
+            raise ValueError((
+                'The server runs in `{s}`, '
+                'not in `{c}`.').format(s=self.server.cwd, c=req['cwd']))
+        for var, value in req['env'].items():
+            if value is None:
+                os.environ.pop(var, None)
+            else:
+                os.environ[var] = value
+        pairs, clean, limits, _ = _parse_args(
+            req['argv'], _RequestArgumentParser)
+        _run(pairs, clean, limits, self.server.memo)
+
+
+class _RequestArgumentParser(argparse.ArgumentParser):
+    """Parser that raises `ValueError` instead of exiting.
+
+    Exiting would stop the server.
+    """
+
+    def exit(self, status=0, message=None):
+        raise ValueError(message or 'exit status {s}'.format(s=status))
+
+    def error(self, message):
+        raise ValueError(message)
+
+
+def request(argv, fname=SOCKET_FILE):
+    """Send arguments `argv` to the server listening on `fname`.
+
+    @param argv: `list` of arguments of this script,
+        or `None` to check whether a server runs
+    @return: response of server as `dict`,
+        or `None` if no server is listening
+    """
+    if not os.path.exists(fname):
+        return None
+    if argv is None:
+        req = dict()
     else:
-        p = set()
-    p.add(fout)
-    p.add(old)
-    with open(memo, 'wb') as f:
-        pickle.dump(p, f)
-
-
-def _parse_args():
-    """Return input and output file names."""
-    p = argparse.ArgumentParser()
-    p.add_argument('-i', '--input', type=str,
-                   help='input file')
-    p.add_argument('-o', '--output', type=str,
-                   help='output file')
+        env = {var: os.environ.get(var) for var in CLIENT_VARS}
+        req = dict(argv=argv, cwd=os.getcwd(), env=env)
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as s:
+        try:
+            s.connect(fname)
+        except OSError:
+            return None
+        s.sendall((json.dumps(req) + '\n').encode())
+        with s.makefile('rb') as f:
+            line = f.readline()
+    if not line:
+        raise RuntimeError(
+            'The server on `{f}` closed the connection.'.format(f=fname))
+    return json.loads(line.decode())
+
+
+def convert(pairs, fname='tla2tex_input.tex', memo=None):
+    """Convert changed TLA+ files using one call of `tla2tex.TeX`.
+
+    @param pairs: `list` of `(input, output)` file names
+    @param fname: name of LaTeX file for `tla2tex.TeX`
+    @param memo: `dict` that maps output file names to
+        digests of inputs and modification times of outputs,
+        as returned by `_load_memo`. If `None`, then
+        digests are read from the memoization index.
+    """
+    context = _context_digest()
+    pairs = dict(pairs)
+    digests = {
+        fout: _input_digest(fin, context)
+        for fin, fout in pairs.items()}
+    recorded = _recorded_digests(digests, memo)
+    changed = [
+        (fin, fout) for fin, fout in pairs.items()
+        if not _is_unchanged(fin, fout, digests[fout], recorded)]
+    changed = [
+        (fin, fout) for fin, fout in changed
+        if not _load_shared(fout, digests[fout])]
+    if changed:
+        specs = list()
+        for fin, _ in changed:
+            with open(fin, 'r') as f:
+                specs.append(f.read())
+        # private directory, so that conversions can run in parallel
+        workdir = tempfile.mkdtemp(prefix=WORKDIR_PREFIX, dir=CACHE_DIR)
+        try:
+            call_tla2tex(specs, fname, workdir, workdir + '.log')
+            path = os.path.join(workdir, fname)
+            blocks = _load_tex_blocks(path)
+            if len(blocks) != len(changed):
+                raise RuntimeError((
+                    'Expected {n} `tlatex` environments in "{f}", '
+                    'found {m}.').format(
+                        n=len(changed), f=fname, m=len(blocks)))
+            for (fin, fout), lines in zip(changed, blocks):
+                s = _dump_tex(lines, fout)
+                _dump_shared(s, digests[fout])
+        finally:
+            shutil.rmtree(workdir)
+    # record digests, after successful conversion
+    _record_file_names(digests)
+    if memo is not None:
+        memo.update(_memo_entries(digests))
+
+
+def _recorded_digests(fouts, memo=None):
+    """Return `dict` of recorded digests of inputs for `fouts`.
+
+    An output file that was modified after its digest was recorded
+    in `memo` is omitted, because another process may have written it.
+    """
+    if memo is None:
+        with _memo_index() as con:
+            rows = [
+                con.execute(
+                    'SELECT name, digest FROM entries WHERE name = ?',
+                    (fout,)).fetchone()
+                for fout in fouts]
+        return dict(row for row in rows if row is not None)
+    recorded = dict()
+    for fout in fouts:
+        if fout not in memo or not os.path.isfile(fout):
+            continue
+        digest, mtime = memo[fout]
+        if os.stat(fout).st_mtime_ns == mtime:
+            recorded[fout] = digest
+    return recorded
+
+
+def _load_memo():
+    """Return digests of existing output files from the index.
+
+    @return: `dict` that maps output file names to
+        pairs of digest of input and modification time of output
+    """
+    with _memo_index() as con:
+        rows = con.execute(
+            'SELECT name, digest FROM entries '
+            'WHERE digest IS NOT NULL').fetchall()
+    return _memo_entries({
+        name: digest for name, digest in rows
+        if os.path.isfile(name)})
+
+
+def _memo_entries(digests):
+    """Return `dict` of digests and modification times of outputs."""
+    return {
+        name: (digest, os.stat(name).st_mtime_ns)
+        for name, digest in digests.items()}
+
+
+def _record_file_names(digests):
+    """Record output files as used now, with digests of inputs.
+
+    @param digests: `dict` that maps output file names to digests
+    """
+    now = time.time()
+    rows = [
+        (name, digest, os.stat(name).st_size, now)
+        for name, digest in digests.items()]
+    with _memo_index() as con:
+        con.executemany(
+            'INSERT OR REPLACE INTO entries '
+            '(name, digest, size, last_used) VALUES (?, ?, ?, ?)',
+            rows)
+
+
+@contextlib.contextmanager
+def _memo_index():
+    """Yield connection to memoization index, within a transaction."""
+    path = os.path.join(CACHE_DIR, INDEX_FILE)
+    is_new = not os.path.isfile(path)
+    con = sqlite3.connect(path, timeout=60, isolation_level=None)
+    try:
+        con.execute('PRAGMA journal_mode=WAL')
+        con.execute('BEGIN IMMEDIATE')
+        try:
+            for statement in INDEX_TABLES:
+                con.execute(statement)
+            if is_new:
+                _import_legacy_memo(con)
+            yield con
+        except BaseException:
+            con.execute('ROLLBACK')
+            raise
+        con.execute('COMMIT')
+    finally:
+        con.close()
+
+
+def _import_legacy_memo(con):
+    """Move file names from the memoization pickle files to `entries`.
+
+    File names without a digest are removed at the next collection.
+    """
+    names = set()
+    memo, old_memo = _memo_file_names()
+    for fname in (memo, old_memo):
+        if not os.path.isfile(fname):
+            continue
+        with open(fname, 'rb') as f:
+            names.update(pickle.load(f))
+        os.remove(fname)
+    if os.path.isfile(MEMO_INCLUDEONLY):
+        os.remove(MEMO_INCLUDEONLY)
+    con.executemany(
+        'INSERT OR IGNORE INTO entries (name, size, last_used) '
+        'VALUES (?, 0, 0)',
+        ((name,) for name in names))
+
+
+def _parse_args(argv=None, parser=argparse.ArgumentParser):
+    """Return pairs of input and output file names, and options.
+
+    @param parser: class of argument parser
+    """
+    p = parser()
+    p.add_argument('-i', '--input', type=str, nargs='+', default=list(),
+                   help='input files')
+    p.add_argument('-o', '--output', type=str, nargs='+', default=list(),
+                   help='output files, one for each input file')
+    p.add_argument('-m', '--manifest', type=str,
+                   help='file with an input and an output file name '
+                        'on each line')
     p.add_argument('--remove-outdated', action='store_true',
-                   help='delete unused memoization files')
+                   help='delete old and least recently used '
+                        'memoization files')
+    p.add_argument('--max-age', type=float, default=MAX_AGE,
+                   help='delete memoization files unused for '
+                        'this many days (default: %(default)s)')
+    p.add_argument('--max-entries', type=int, default=MAX_ENTRIES,
+                   help='number of memoization files to keep '
+                        '(default: %(default)s)')
+    p.add_argument('--max-bytes', type=int, default=MAX_BYTES,
+                   help='total size of memoization files to keep '
+                        '(default: %(default)s)')
     p.add_argument('--only-included', type=str,
-                   help='restrict deletion to memo for these TeX files')
-    args = p.parse_args()
-    fin = args.input
-    fout = args.output
+                   help='ignored, kept for compatibility')
+    p.add_argument('--serve', action='store_true',
+                   help='convert for other calls of this script, '
+                        'until interrupted')
+    args = p.parse_args(argv)
+    if len(args.input) != len(args.output):
+        p.error('give one output file for each input file')
+    pairs = list(zip(args.input, args.output))
+    if args.manifest is not None:
+        pairs.extend(_load_manifest(args.manifest))
     clean = args.remove_outdated
-    fnames = _split_included_file_names(args.only_included)
+    limits = dict(
+        max_age=args.max_age,
+        max_entries=args.max_entries,
+        max_bytes=args.max_bytes)
     log.info('\ncoverting using `tla2tex.TeX`...')
-    log.info('input file: {f}'.format(f=fin))
-    log.info('output file: {f}'.format(f=fout))
-    return fin, fout, clean, fnames
-
+    for fin, fout in pairs:
+        log.info('input file: {f}'.format(f=fin))
+        log.info('output file: {f}'.format(f=fout))
+    return pairs, clean, limits, args.serve
 
-def _split_included_file_names(only_included):
-    # `\includeonly` absent from document ?
-    if only_included == 'undefined':
-        only_included = None
-    if only_included is None:
-        return None
-    # A trailing comma as in `\includeonly{./tex/foo.tex,}`
-    # causes the empty string to be included by `str.split`.
-    paths = [p for p in only_included.split(',') if p != '']
-    fnames = [os.path.split(p)[1] for p in paths]
-    return fnames
 
+def _load_manifest(fname):
+    """Return pairs of input and output file names from `fname`.
 
-def _is_unchanged(fin, fout, old):
-    """Return `True` if environment didn't change."""
+    Blank lines and lines that start with `#` are ignored.
+    """
+    pairs = list()
+    with open(fname, 'r') as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue
+            fin, fout = line.split()
+            pairs.append((fin, fout))
+    return pairs
+
+
+def _is_unchanged(fin, fout, digest, recorded):
+    """Return `True` if environment didn't change.
+
+    @param digest: current digest of input for `fout`
+    @param recorded: `dict` of recorded digests,
+        as returned by `_recorded_digests`
+    """
     # assertions about input file
     assert os.path.isfile(fin), fin
     _, ext = os.path.splitext(fin)
@@ -126,8 +493,7 @@ def _is_unchanged(fin, fout, old):
     # unchanged ?
     if (  # skip if output exists and new input matches old input
             os.path.isfile(fout) and
-            os.path.isfile(old) and
-            filecmp.cmp(fin, old)):
+            recorded.get(fout) == digest):
         log.info((
             'TLA+ file `{fin}` unchanged. '
             'Returning.').format(fin=fin))
@@ -135,33 +501,110 @@ def _is_unchanged(fin, fout, old):
     return False
 
 
-def call_tla2tex(s, fname):
-    """Dump string `s` to `fname` and call `tla2tex.TeX`."""
+def _context_digest():
+    """Return digest of preamble, `SKIP`, and tool version."""
+    h = hashlib.sha256()
+    if os.path.isfile(PREAMBLE):
+        with open(PREAMBLE, 'rb') as f:
+            h.update(f.read())
+    s = '\0{skip}\0{fmt}\0{version}'.format(
+        skip=SKIP, fmt=FORMAT_VERSION, version=_tool_version())
+    h.update(s.encode())
+    return h.hexdigest()
+
+
+def _tool_version():
+    """Return version of `tla2tex.TeX`.
+
+    The version is the value of `TOOL_VERSION_VAR`, if set,
+    else the digests of `TLAENV` and of the `*.jar` files
+    in `CLASSPATH`. The digest of each file is computed once,
+    and again only if its size or modification time changes.
+    """
+    version = os.environ.get(TOOL_VERSION_VAR)
+    if version:
+        return version
+    paths = [shutil.which(TLAENV)]
+    classpath = os.environ.get('CLASSPATH', '')
+    paths.extend(
+        path for path in classpath.split(os.pathsep)
+        if path.endswith('.jar'))
+    digests = list()
+    for path in paths:
+        if path is None or not os.path.isfile(path):
+            continue
+        st = os.stat(path)
+        key = (os.path.realpath(path), st.st_size, st.st_mtime_ns)
+        if key not in _tool_digests:
+            _tool_digests[key] = file_io.file_digest(path)
+        digests.append(_tool_digests[key])
+    return ','.join(digests)
+
+
+def _input_digest(fin, context):
+    """Return digest of contents of file `fin` and `context`."""
+    h = hashlib.sha256()
+    with open(fin, 'rb') as f:
+        h.update(f.read())
+    h.update(context.encode())
+    return h.hexdigest()
+
+
+def call_tla2tex(specs, fname, cwd=None, log_file=None):
+    """Dump strings `specs` to `fname` and call `tla2tex.TeX`.
+
+    Each item of `specs` becomes a `tla` environment.
+
+    @param cwd: directory where `fname` is created and `tla2tex.TeX`
+        runs. LaTeX searches for files also in the current directory.
+    @param log_file: if not `None`, then the LaTeX log is copied
+        to this file if the conversion fails, for example
+        because `cwd` is removed afterwards
+    """
     _assert_preamble_exists()
+    if isinstance(specs, str):
+        specs = [specs]
+    if cwd is None:
+        cwd = os.curdir
     # dump dummy module
-    s = template.format(spec=s)
-    with open(fname, 'w') as f:
+    envs = ''.join(env_template.format(spec=spec) for spec in specs)
+    s = template.format(envs=envs)
+    with open(os.path.join(cwd, fname), 'w') as f:
         f.write(s)
     cmd = [  # shade selected from within the document
         TLAENV,
         # TODO: call tla2tex.TeX directly, using environment variables
         '-latexCommand', 'xelatex',
         fname]
-    r = subprocess.call(cmd)
+    # find `tex/preamble.tex` from `cwd`
+    env = dict(os.environ)
+    env['TEXINPUTS'] = os.getcwd() + os.pathsep + env.get('TEXINPUTS', '')
+    r = subprocess.call(cmd, cwd=cwd, env=env)
     if r != 0:
-        raise RuntimeError('`tla2tex.TeX` exit status != 0')
+        raise RuntimeError(
+            '`tla2tex.TeX` exit status != 0, see `{log}`.'.format(
+                log=_keep_log(cwd, log_file)))
     # detect LaTeX errors during alignment
     # (`tla2tex.TeX` returns 0 in these cases)
-    pdf_file = 'tlatex.pdf'
+    pdf_file = os.path.join(cwd, 'tlatex.pdf')
     if not os.path.isfile(pdf_file):
         raise RuntimeError(
             'Alignment with LaTeX failed, '
-            'see `tlatex.log`.')
+            'see `{log}`.'.format(log=_keep_log(cwd, log_file)))
+
+
+def _keep_log(cwd, log_file):
+    """Return path of LaTeX log in `cwd`, copied to `log_file`."""
+    path = os.path.join(cwd, 'tlatex.log')
+    if log_file is None or not os.path.isfile(path):
+        return path
+    shutil.copy(path, log_file)
+    return log_file
 
 
 def _assert_preamble_exists():
     """Raise `FileNotFoundError` if no preamble file."""
-    fname = './tex/preamble.tex'
+    fname = PREAMBLE
     if os.path.isfile(fname):
         return
     raise FileNotFoundError(
@@ -169,21 +612,34 @@ def _assert_preamble_exists():
             fname=fname))
 
 
-def _load_tex(fname):
-    """Load output of `tla2tex.TeX` from `fname`."""
+def _load_tex_blocks(fname):
+    """Load outputs of `tla2tex.TeX` from `fname`.
+
+    @return: `list` of `list` of lines,
+        one for each `tlatex` environment
+    """
     begin = '\\begin{tlatex}\n'
     end = '\\end{tlatex}\n'
     with open(fname, 'r') as f:
         lines = f.readlines()
-    x = lines.index(begin)
-    y = lines.index(end)
+    blocks = list()
+    x = None
+    for y, line in enumerate(lines):
+        if line == begin:
+            x = y
+        elif line == end and x is not None:
+            blocks.append(_strip_block(lines, x, y))
+            x = None
+    return blocks
+
+
+def _strip_block(lines, x, y):
+    """Return lines `x` to `y` without trailing whitespace command."""
     # is last line whitespace ?
     if lines[y - 1].startswith('\\@pvspace{'):
-        lines = lines[x:y - 1]
-    else:
-        print('Second to last line: {s}'.format(s=lines[y - 1]))
-        lines = lines[x:y]
-    return lines
+        return lines[x:y - 1]
+    print('Second to last line: {s}'.format(s=lines[y - 1]))
+    return lines[x:y]
 
 
 def _dump_tex(lines, fout):
@@ -193,58 +649,101 @@ def _dump_tex(lines, fout):
         ''.join(lines) +
         '\\@pvspace{' + str(SKIP) +
             '.0pt}%\n\\end{tlatex}\\noindent%')
-    with open(fout, 'w') as f:
-        f.write(s)
+    file_io.write_file(fout, s, FILE_MODE)
+    return s
 
 
-def _collect_garbage(current_fnames):
-    """Delete memoization files that are unused."""
-    print('\nCollecting memoization garbage.\n')
-    memo, old_memo = _memo_file_names()
-    if not os.path.isfile(memo):
-        print('File "{memo}" does not exist.'.format(memo=memo))
-        return
-    if not os.path.isfile(old_memo):
-        shutil.move(memo, old_memo)
-        print('File "{old_memo}" did not exist'.format(old_memo=old_memo))
+def _shared_file_name(digest):
+    """Return file name for `digest` in shared cache, or `None`."""
+    shared_dir = os.environ.get(SHARED_CACHE_VAR)
+    if not shared_dir:
+        return None
+    return os.path.join(shared_dir, digest[:2], digest + '.tex')
+
+
+def _load_shared(fout, digest):
+    """Copy output for `digest` from shared cache to `fout`.
+
+    @return: `True` if found in the shared cache
+    """
+    shared = _shared_file_name(digest)
+    if shared is None:
+        return False
+    try:
+        with open(shared, 'r') as f:
+            s = f.read()
+    except FileNotFoundError:
+        return False
+    log.info('Found `{f}` in shared cache.'.format(f=fout))
+    file_io.write_file(fout, s, FILE_MODE)
+    return True
+
+
+def _dump_shared(s, digest):
+    """Store output `s` for `digest` in shared cache."""
+    shared = _shared_file_name(digest)
+    if shared is None:
         return
-    # both memo and old_memo exist
-    # remove files with names contained in old_memo but not in memo
-    with open(memo, 'rb') as f:
-        new_files = pickle.load(f)
-    with open(old_memo, 'rb') as f:
-        old_files = pickle.load(f)
-    included = _filter_by_includeonly(old_files)
-    unused = included.difference(new_files)
-    _remove_unused_memoization_files(unused)
-    # used memoization files
-    used = old_files.difference(unused).union(new_files)
-    # replace old memo
-    os.remove(memo)
-    with open(old_memo, 'wb') as f:
-        pickle.dump(used, f)
-    # new `\includeonly` files
-    # restrict attention to `\includeonly` files
-    with open(MEMO_INCLUDEONLY, 'wb') as f:
-        pickle.dump(current_fnames, f)
-
-
-def _filter_by_includeonly(old_files):
-    """Return memo files that correspond to included LaTeX files."""
-    if not os.path.isfile(MEMO_INCLUDEONLY):
-        return old_files
-    with open(MEMO_INCLUDEONLY, 'rb') as f:
-        fnames = pickle.load(f)
-    if fnames is None:
-        return old_files
-    assert '' not in fnames, fnames
-    t = tuple(fnames)
-    included = set()
-    for path in old_files:
-        _, fname = os.path.split(path)
-        if fname.startswith(t):
-            included.add(path)
-    return included
+    head, _ = os.path.split(shared)
+    os.makedirs(head, exist_ok=True)
+    file_io.write_file(shared, s, FILE_MODE)
+
+
+def _collect_garbage(
+        max_age=MAX_AGE, max_entries=MAX_ENTRIES, max_bytes=MAX_BYTES):
+    """Delete memoization files that are old or least recently used.
+
+    Files are kept in order of last use, starting from the most recent,
+    while at most `max_entries` files of total size at most `max_bytes`
+    are kept. Files unused for more than `max_age` days are deleted.
+    """
+    print('\nCollecting memoization garbage.\n')
+    oldest = time.time() - max_age * 24 * 3600
+    with _memo_index() as con:
+        rows = con.execute(
+            'SELECT name, digest, size, last_used FROM entries '
+            'ORDER BY last_used DESC')
+        n = 0
+        total = 0
+        unused = list()
+        for name, digest, size, last_used in rows:
+            keep = (
+                digest is not None and
+                last_used >= oldest and
+                n < max_entries and
+                total + size <= max_bytes)
+            if keep:
+                n += 1
+                total += size
+            else:
+                unused.append(name)
+        _remove_unused_memoization_files(unused)
+        con.executemany(
+            'DELETE FROM entries WHERE name = ?',
+            ((name,) for name in unused))
+    print('Kept {n} files of {b} bytes.'.format(n=n, b=total))
+    _remove_stale_workdirs()
+
+
+def _remove_stale_workdirs(max_age=STALE_WORKDIR_AGE):
+    """Remove temporary directories and logs of old conversions.
+
+    These are left by conversions that failed, or by processes
+    that were killed. Recent ones are kept, because they may
+    belong to conversions that are running.
+    """
+    oldest = time.time() - max_age
+    with os.scandir(CACHE_DIR) as entries:
+        stale = [
+            entry for entry in entries
+            if entry.name.startswith(WORKDIR_PREFIX) and
+            entry.stat(follow_symlinks=False).st_mtime < oldest]
+    for entry in stale:
+        print('deleting stale "{f}"'.format(f=entry.path))
+        if entry.is_dir(follow_symlinks=False):
+            shutil.rmtree(entry.path, ignore_errors=True)
+        else:
+            os.remove(entry.path)
 
 
 def _remove_unused_memoization_files(unused):
@@ -259,11 +758,15 @@ def _remove_unused_memoization_files(unused):
         assert head == CACHE_DIR, (fname, CACHE_DIR)
         _, ext = os.path.splitext(tail)
         assert ext in extensions, (fname, ext)
-        os.remove(fname)
+        if os.path.isfile(fname):
+            os.remove(fname)
 
 
 def _memo_file_names():
-    """Return names of memo and old memo pickle files."""
+    """Return names of memo and old memo pickle files.
+
+    These files are read only to import them to `INDEX_FILE`.
+    """
     memo = os.path.join(CACHE_DIR, MEMO_FILE)
     old_memo = os.path.join(CACHE_DIR, OLD_MEMO_FILE)
     return memo, old_memo
@@ -0,0 +1,320 @@
+#!/usr/bin/env python3
+"""Incrementally rebuild headers and PDF files of TLA+ modules.
+
+The modules are found by following `EXTENDS` statements from
+the root modules, using `tlapy.tla_depends`, in the directory of
+each root module and then in the search path. A module named
+`Foo_header` is generated from the file `Foo_proofs.tla` in the
+same directory, if that file exists (see `tlapy.utils.remove_proofs`).
+Standard modules without a file are not built, and neither are
+modules found in the search path, unless `--libraries` is given.
+
+The build graph has file names as nodes, and an edge from
+each file to each file that is generated from it:
+
+- `Foo_proofs.tla` -> `Foo_header.tla`
+- `Foo.tla` -> `Foo.pdf`
+- `Foo.pdf` -> `merged_tla_modules.pdf` (with `--merge`)
+
+Typesetting a module reads only that module, so `EXTENDS`
+determines which modules are built, not which PDF files depend
+on which modules. The digests of the `*.tla` files are recorded
+in `MANIFEST_FILE`, together with the digest of the options for
+`tla2tex.TLA` and of the style file that they name, which is
+also part of the build key of `tlapy.tla2pdf`. The files that
+are rebuilt are those reachable in the build graph from changed
+`*.tla` files and from missing files, and all PDF files if the
+options or style file changed.
+"""
+import argparse
+import logging
+import os
+
+import networkx as nx
+
+from tlapy import file_io
+from tlapy import tla2pdf
+from tlapy import tla_depends
+from tlapy.utils import join_modules
+from tlapy.utils import remove_proofs
+
+
+MANIFEST_FILE = '__tlacache__/tla_build_manifest.json'
+log = logging.getLogger(__name__)
+
+
+def build(
+        roots, tla2tex_options, merge=False,
+        jobs=1, keep_going=False, dry_run=False,
+        search_path=None, libraries=False):
+    """Rebuild the files of `roots` that are affected by changes.
+
+    @param roots: `*.tla` file names
+    @param merge: if `True`, then join the PDF files
+        of all modules using `tlapy.utils.join_modules`
+    @param dry_run: if `True`, then only return the files
+        that would be rebuilt
+    @param search_path: `list` of directories where modules
+        are looked up, after the directory of each root module
+    @param libraries: if `True`, then build also the modules
+        found in `search_path`, else only the modules in the
+        directories of `roots`
+    @return: names of affected files, in build order
+    @rtype: `list` of `str`
+    """
+    g = build_graph(roots, merge, search_path, libraries)
+    manifest = _load_manifest()
+    digests = _digests(g)
+    options = tla2pdf.options_digest(tla2tex_options)
+    affected = affected_files(g, manifest, digests, options)
+    ordered = [u for u in nx.topological_sort(g) if u in affected]
+    log.info('affected files: {fs}'.format(fs=ordered))
+    if dry_run:
+        return ordered
+    for header in _of_kind(g, ordered, 'header'):
+        proofs, = g.predecessors(header)
+        remove_proofs.remove_proofs(proofs)
+        digests[header] = file_io.file_digest(header)
+    pdfs = _of_kind(g, ordered, 'pdf')
+    tlafiles = [u for pdf in pdfs for u in g.predecessors(pdf)]
+    if tlafiles:
+        tla2pdf.typeset_tla_files(
+            tlafiles, tla2tex_options, jobs, keep_going)
+    if join_modules.MERGED_FILE in affected:
+        pdfs = list(g.predecessors(join_modules.MERGED_FILE))
+        join_modules.join_modules(pdfs)
+    manifest['files'].update(digests)
+    manifest['options'] = options
+    file_io.dump_json(MANIFEST_FILE, manifest)
+    return ordered
+
+
+def build_graph(roots, merge=False, search_path=None, libraries=False):
+    """Return graph from files to files generated from them.
+
+    The node attribute `kind` is one of:
+    `'module'`, `'proofs'`, `'header'`, `'pdf'`, `'merged'`.
+
+    @param roots: `*.tla` file names
+    @param search_path, libraries: as for `build`
+    @rtype: `networkx.DiGraph`
+    """
+    kinds = ('local', 'library') if libraries else ('local',)
+    # each directory is listed once
+    listings = dict()
+    deps = _module_graph(roots, search_path, listings)
+    # modules before the modules that extend them
+    modules = reversed(list(nx.topological_sort(deps)))
+    g = nx.DiGraph()
+    for module in modules:
+        d = deps.nodes[module]
+        tlafile = d['path']
+        proofs = d.get('proofs')
+        if d['kind'] not in kinds:
+            # `'standard'`, `'missing'`, or a library not built
+            continue
+        if proofs is not None:
+            g.add_node(proofs, kind='proofs')
+            g.add_node(tlafile, kind='header')
+            g.add_edge(proofs, tlafile)
+        else:
+            g.add_node(tlafile, kind='module')
+        base, _ = os.path.splitext(tlafile)
+        pdf = base + '.pdf'
+        g.add_node(pdf, kind='pdf')
+        g.add_edge(tlafile, pdf)
+        if merge:
+            g.add_node(join_modules.MERGED_FILE, kind='merged')
+            g.add_edge(pdf, join_modules.MERGED_FILE)
+    return g
+
+
+def _module_graph(roots, search_path=None, listings=None):
+    """Return graph of `EXTENDS` from modules in `roots`.
+
+    The nodes are module names, with the attributes `kind`
+    and `path` of `tla_depends.dependency_graph`, except that
+    modules in the directory of any root module are `'local'`,
+    and modules in other directories are `'library'`. A header that
+    is generated from a proofs module has also the attribute
+    `proofs` (the file name of the proofs module), and `path`
+    is the name of the header file, whether it exists or not.
+    The header extends the same modules as the proofs module.
+
+    @param listings: as for `_module_index`
+    """
+    if search_path is None:
+        search_path = list()
+    if listings is None:
+        listings = dict()
+    root_dirs = {_dirname(fname) for fname in roots}
+    g = nx.DiGraph()
+    todo = [os.path.normpath(fname) for fname in roots]
+    done = set()
+    while todo:
+        fname = todo.pop()
+        if fname in done:
+            continue
+        done.add(fname)
+        root_dir, base = os.path.split(fname)
+        module, _ = os.path.splitext(base)
+        index = _module_index(
+            [root_dir or os.curdir, *search_path], listings)
+        h = tla_depends.dependency_graph(
+            fname, search_path=search_path, index=index)
+        header = _header_module(module)
+        if header is not None:
+            # proofs modules are sources, not modules of the spec
+            path = os.path.normpath(remove_proofs.header_file_name(fname))
+            g.add_node(header, kind='local', path=path, proofs=fname)
+            g.add_edges_from(
+                (header, v) for v in h.successors(module))
+            h.remove_node(module)
+        for u, d in h.nodes(data=True):
+            if 'proofs' not in g.nodes.get(u, d):
+                g.add_node(u, **d)
+        g.add_edges_from(h.edges)
+        for u, d in h.nodes(data=True):
+            proofs = _proofs_file(u, d['path'], index)
+            if proofs is not None:
+                todo.append(proofs)
+    for u, d in g.nodes(data=True):
+        if d['kind'] == 'missing':
+            print('Cannot find file: {f}'.format(f=u + '.tla'))
+        elif d['kind'] in ('local', 'library'):
+            is_local = _dirname(d['path']) in root_dirs
+            d['kind'] = 'local' if is_local else 'library'
+    return g
+
+
+def _module_index(dirs, listings):
+    """Return `tla_depends.module_index(dirs)`.
+
+    @param listings: `dict` that maps each directory listed
+        so far to its index, and is updated, so that each
+        directory is listed once
+    """
+    index = dict()
+    for dirpath in reversed(dirs):
+        dirpath = os.path.normpath(dirpath)
+        if dirpath not in listings:
+            listings[dirpath] = tla_depends.module_index([dirpath])
+        index.update(listings[dirpath])
+    return index
+
+
+def _dirname(fname):
+    """Return normalized directory of file `fname`."""
+    return os.path.normpath(os.path.dirname(fname) or os.curdir)
+
+
+def _proofs_file(module, path, index):
+    """Return file that header `module` is generated from, if any.
+
+    The proofs module is looked up in the directory of `path`,
+    if `path` is not `None`, else in `index`.
+
+    @param path: file name of `module`, or `None`
+    @param index: as returned by `tla_depends.module_index`
+    """
+    if not module.endswith(remove_proofs.HEADER_SUFFIX):
+        return None
+    n = len(remove_proofs.HEADER_SUFFIX)
+    proofs = module[:-n] + remove_proofs.PROOF_SUFFIX
+    if path is None:
+        return index.get(proofs)
+    fname = os.path.join(os.path.dirname(path), proofs + '.tla')
+    if not os.path.isfile(fname):
+        return None
+    return os.path.normpath(fname)
+
+
+def _header_module(module):
+    """Return header generated from proofs `module`, if any."""
+    if not module.endswith(remove_proofs.PROOF_SUFFIX):
+        return None
+    n = len(remove_proofs.PROOF_SUFFIX)
+    return module[:-n] + remove_proofs.HEADER_SUFFIX
+
+
+def affected_files(g, manifest, digests, options=None):
+    """Return files that need to be rebuilt.
+
+    @param manifest: digests recorded after the previous build
+    @param digests: current digests of `*.tla` files
+    @param options: current digest of options for `tla2tex.TLA`,
+        as returned by `tla2pdf.options_digest`
+    @rtype: `set`
+    """
+    options_changed = manifest['options'] != options
+    changed = set()
+    for u in g:
+        if not os.path.isfile(u):
+            changed.add(u)
+        elif u in digests and manifest['files'].get(u) != digests[u]:
+            changed.add(u)
+        elif options_changed and g.nodes[u]['kind'] == 'pdf':
+            changed.add(u)
+    affected = set()
+    for u in changed:
+        if g.in_degree(u) > 0:  # generated file
+            affected.add(u)
+        affected.update(nx.descendants(g, u))
+    return affected
+
+
+def _of_kind(g, files, kind):
+    """Return items of `files` with attribute `kind` in `g`."""
+    return [u for u in files if g.nodes[u]['kind'] == kind]
+
+
+def _digests(g):
+    """Return digests of existing `*.tla` files in `g`."""
+    return {
+        u: file_io.file_digest(u) for u in g
+        if u.endswith('.tla') and os.path.isfile(u)}
+
+
+def _load_manifest():
+    """Return digests recorded in `MANIFEST_FILE`."""
+    manifest = file_io.load_json(MANIFEST_FILE) or dict()
+    manifest.setdefault('files', dict())
+    manifest.setdefault('options', None)
+    return manifest
+
+
+def _parse_args():
+    """Return root modules, options for `tla2tex.TLA`, and flags."""
+    p = argparse.ArgumentParser()
+    p.add_argument('-i', '--input', nargs='+', type=str, required=True,
+                   help='root `*.tla` files. Additional arguments '
+                        'are passed to `tla2tex.TLA`.')
+    p.add_argument('-I', '--include', action='append',
+                   default=list(), metavar='DIR',
+                   help='search for modules also in this directory '
+                        '(for example, the TLAPS library); '
+                        'can be repeated')
+    p.add_argument('--libraries', action='store_true',
+                   help='build also the modules found in '
+                        '`--include` directories')
+    p.add_argument('--merge', action='store_true',
+                   help='join the PDF files of modules')
+    file_io.add_jobs_argument(
+        p, 'number of files to typeset in parallel')
+    p.add_argument('-k', '--keep-going', action='store_true',
+                   help='continue typesetting the remaining files '
+                        'after a failure')
+    p.add_argument('-n', '--dry-run', action='store_true',
+                   help='print the files that would be rebuilt')
+    args, unknown = p.parse_known_args()
+    return args, unknown
+
+
+if __name__ == '__main__':
+    args, tla2tex_options = _parse_args()
+    files = build(
+        args.input, tla2tex_options, args.merge,
+        args.jobs, args.keep_going, args.dry_run,
+        args.include, args.libraries)
+    if args.dry_run:
+        print('\n'.join(files))
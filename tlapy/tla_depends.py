@@ -5,52 +5,320 @@
 #
 import argparse
 import os
-import re
 
 import networkx as nx
 
+from tlapy import file_io
+from tlapy import graph_io
+from tlapy import lexer
 
-def dump_dependency_graph(fname):
-    g = dependency_graph(fname)
-    pd = nx.drawing.nx_pydot.to_pydot(g)
-    pd.write_pdf('dependency_graph.pdf')
 
+CACHE_FILE = '__tlacache__/tla_depends.json'
+DEPENDENCY_GRAPH = 'dependency_graph.pdf'
+# increment when the results of `find_dependencies` change
+CACHE_VERSION = 2
+# declarations that can precede `INSTANCE` statements
+DECLARATIONS = {'CONSTANT', 'CONSTANTS', 'VARIABLE', 'VARIABLES'}
+# modules provided by the tools, without a `*.tla` file
+STANDARD_MODULES = {
+    'Bags', 'FiniteSets', 'Integers', 'Naturals',
+    'Randomization', 'RealTime', 'Reals', 'Sequences',
+    'TLC', 'TLCExt', 'Toolbox'}
+# memoized results of `find_dependencies`,
+# as file name -> `dict(stamp=..., digest=..., modules=...)`
+_memo = dict()
 
-def dependency_graph(fname):
-    module, ext = os.path.splitext(fname)
+
+def dump_dependency_graph(
+        fname, cache_file=None, search_path=None, outputs=None):
+    """Write the graph of modules extended by `fname` to `outputs`.
+
+    Each output file is written in the format of its extension,
+    as described in `tlapy.graph_io.dump_graph`.
+
+    @param outputs: `list` of file names,
+        by default `[DEPENDENCY_GRAPH]`
+    """
+    if outputs is None:
+        outputs = [DEPENDENCY_GRAPH]
+    g = dependency_graph(fname, cache_file, search_path)
+    g.name = os.path.splitext(os.path.basename(fname))[0]
+    for module, kind in g.nodes(data='kind'):
+        if kind == 'missing':
+            print('Cannot find file: {f}'.format(f=module + '.tla'))
+    for output in outputs:
+        graph_io.dump_graph(g, output)
+
+
+def dependency_graph(
+        fname, cache_file=None, search_path=None, index=None):
+    """Return graph of modules extended by the module `fname`.
+
+    Modules are looked up in the directory of `fname`, then in
+    the directories `search_path`, using `module_index`.
+    The node attribute `kind` is one of:
+
+    - `'local'`: found in the directory of `fname`
+    - `'library'`: found in `search_path`
+    - `'standard'`: in `STANDARD_MODULES`, not found
+    - `'missing'`: not found
+
+    and the node attribute `path` is the file name, or `None`.
+    Missing modules are not reported, so that callers can
+    decide which of them are errors.
+
+    Each module is visited once. The dependencies of each file
+    are memoized, and reused while the size and modification time
+    of the file remain the same.
+
+    @param cache_file: if not `None`, then also store dependencies
+        in this JSON file, keyed by file digest, for reuse by
+        later runs (for example, `CACHE_FILE`)
+    @param search_path: `list` of directories
+    @param index: if not `None`, then the result of `module_index`
+        for the directory of `fname` and `search_path`, so that
+        callers of several graphs list each directory once
+    @rtype: `networkx.DiGraph`
+    """
+    root_dir, base = os.path.split(fname)
+    module, ext = os.path.splitext(base)
     assert ext == '.tla', ext
+    if search_path is None:
+        search_path = list()
+    root_dir = root_dir or os.curdir
+    if index is None:
+        index = module_index([root_dir, *search_path])
+    cache = _load_cache(cache_file)
     stack = [module]
+    visited = {module}
     g = nx.DiGraph()
     while stack:
         module = stack.pop()
-        modules = find_dependencies(module)
-        if modules is None:
+        path = index.get(module)
+        _add_module_node(g, module, path, root_dir)
+        if path is None:
             continue
+        modules = _memoized_dependencies(module, path, cache)
         gen = ((module, v) for v in modules)
         g.add_edges_from(gen)
-        stack.extend(modules)
+        new = [v for v in modules if v not in visited]
+        visited.update(new)
+        stack.extend(new)
+    if cache_file is not None:
+        _dump_cache(cache_file, cache)
     return g
 
 
-def find_dependencies(module):
-    fname = module + '.tla'
+def module_index(search_path):
+    """Return `dict` that maps module names to file names.
+
+    Each directory is listed once. If a module is in several
+    directories, then the first directory in `search_path` is used.
+
+    @param search_path: `list` of directories
+    """
+    index = dict()
+    for dirpath in reversed(search_path):
+        try:
+            entries = os.scandir(dirpath)
+        except OSError:
+            print('Cannot list directory: {d}'.format(d=dirpath))
+            continue
+        with entries:
+            for entry in entries:
+                module, ext = os.path.splitext(entry.name)
+                if ext != '.tla' or not entry.is_file():
+                    continue
+                path = os.path.join(dirpath, entry.name)
+                index[module] = os.path.normpath(path)
+    return index
+
+
+def _add_module_node(g, module, path, root_dir):
+    """Add node `module` to graph `g`, with attributes."""
+    if path is None and module in STANDARD_MODULES:
+        kind = 'standard'
+    elif path is None:
+        kind = 'missing'
+    elif (os.path.dirname(path) or os.curdir) == os.path.normpath(root_dir):
+        kind = 'local'
+    else:
+        kind = 'library'
+    g.add_node(module, kind=kind, path=path)
+
+
+def _memoized_dependencies(module, fname, cache):
+    """Return `find_dependencies(module, fname)`, using memoized results.
+
+    @param cache: `dict` loaded from cache file, or `None`
+    """
+    try:
+        st = os.stat(fname)
+    except FileNotFoundError:
+        return find_dependencies(module, fname)
+    stamp = [st.st_size, st.st_mtime_ns]
+    entry = _memo.get(fname)
+    if (entry is not None and entry['stamp'] == stamp and
+            (cache is None or entry['digest'] is not None)):
+        if cache is not None:
+            cache[fname] = entry
+        return entry['modules']
+    entry = None if cache is None else cache.get(fname)
+    digest = None
+    if entry is not None and entry['stamp'] != stamp:
+        # the contents may be unchanged
+        digest = file_io.file_digest(fname)
+        if entry['digest'] != digest:
+            entry = None
+    if entry is None:
+        if cache is not None and digest is None:
+            digest = file_io.file_digest(fname)
+        modules = find_dependencies(module, fname)
+        entry = dict(digest=digest, modules=modules)
+    entry['stamp'] = stamp
+    if cache is not None:
+        cache[fname] = entry
+    _memo[fname] = entry
+    return entry['modules']
+
+
+def _load_cache(cache_file):
+    """Return `dict` stored in `cache_file`, or `None`."""
+    if cache_file is None:
+        return None
+    data = file_io.load_json(cache_file)
+    if data is None or data.get('version') != CACHE_VERSION:
+        return dict()
+    return data['files']
+
+
+def _dump_cache(cache_file, cache):
+    """Atomically write `cache` to `cache_file`."""
+    data = dict(version=CACHE_VERSION, files=cache)
+    file_io.dump_json(cache_file, data)
+
+
+def find_dependencies(module, fname=None):
+    """Return modules that `module` extends or instantiates.
+
+    Only the header of the module is read: the `EXTENDS` statement,
+    followed by any `INSTANCE` statements and `CONSTANT` or
+    `VARIABLE` declarations. Reading stops at the first other unit.
+
+    @param fname: file of `module`, by default `module + '.tla'`
+    @return: `list` of module names, or `None` if no file found
+    """
+    if fname is None:
+        fname = module + '.tla'
     if not os.path.isfile(fname):
         print('Cannot find file: {fname}'.format(fname=fname))
         return
-    with open(fname, 'r') as f:
-        lines = f.readlines()
-    line, *_ = lines
-    m = re.match('-* MODULE ([a-zA-Z0-9]*) -*', line)
-    module_name, = m.groups()
-    extends_modules = list()
-    for line in lines:
-        if not line.startswith('EXTENDS'):
-            continue
-        line = line.lstrip()
-        s = line.split('EXTENDS', 1)[1]
-        modules = comma_to_list(s)
-        extends_modules.extend(modules)
-    return extends_modules
+    modules = _header_dependencies(lexer.read_lines(fname))
+    # remove duplicates
+    return list(dict.fromkeys(modules))
+
+
+def _header_dependencies(lines):
+    """Return modules in `EXTENDS` and `INSTANCE` of module header.
+
+    Reads from the iterable `lines` only as far as needed.
+    """
+    tokens = _code_tokens(lines)
+    # the module can be preceded by comments
+    for tok, _ in tokens:
+        if tok == 'MODULE':
+            break
+    modules = list()
+    tok, _ = next(tokens, (None, None))
+    while tok is not None and not tok.startswith('===='):
+        if tok.startswith('----'):
+            tok, _ = next(tokens, (None, None))
+        elif tok == 'EXTENDS':
+            tok = _read_names(tokens, modules)
+        elif tok == 'LOCAL':
+            tok, _ = next(tokens, (None, None))
+        elif tok == 'INSTANCE':
+            name, _ = next(tokens, (None, None))
+            modules.append(name)
+            tok = _skip_unit(tokens)
+        elif tok in DECLARATIONS:
+            tok = _skip_unit(tokens)
+        else:
+            # named instance `Name == INSTANCE M`,
+            # or `Name(p, q) == INSTANCE M` ?
+            op, _ = next(tokens, (None, None))
+            if op == '(':
+                op = _skip_parameters(tokens)
+            keyword, _ = next(tokens, (None, None))
+            if op != '==' or keyword != 'INSTANCE':
+                break
+            tok = 'INSTANCE'
+    return [name for name in modules if name is not None]
+
+
+def _read_names(tokens, modules):
+    """Append to `modules` a comma-separated list from `tokens`.
+
+    @return: first token after the list
+    """
+    while True:
+        name, _ = next(tokens, (None, None))
+        if name is None:
+            return None
+        modules.append(name)
+        tok, _ = next(tokens, (None, None))
+        if tok != ',':
+            return tok
+
+
+def _skip_parameters(tokens):
+    """Return first token after parameters in parentheses.
+
+    The opening parenthesis has been read. Parameters can
+    be operators with parentheses, like `F(_, _)`.
+    """
+    depth = 1
+    for tok, _ in tokens:
+        if depth == 0:
+            return tok
+        if tok == '(':
+            depth += 1
+        elif tok == ')':
+            depth -= 1
+    return None
+
+
+def _skip_unit(tokens):
+    """Return first token of next unit in `tokens`.
+
+    A unit is assumed to continue until the next token
+    at the start of a line, or the next separator.
+    """
+    for tok, column in tokens:
+        if column == 0 or tok.startswith(('----', '====')):
+            return tok
+    return None
+
+
+def _code_tokens(lines):
+    """Yield `(token, column)` pairs from `lines`.
+
+    Comments and strings are skipped. The first token
+    on each line has the column where the line starts,
+    also if it follows a comment.
+    A module header is yielded as the token `'MODULE'`.
+    """
+    for _, tokens in lexer.tokenize_lines(lines):
+        start = tokens[0].column if tokens else None
+        for tok in tokens:
+            if tok.kind in ('comment', 'string'):
+                continue
+            column = tok.column if start is None else start
+            start = None
+            if tok.kind == 'module':
+                yield 'MODULE', column
+                continue
+            yield tok.text, column
 
 
 def comma_to_list(s):
@@ -63,10 +331,24 @@ def parse_args():
     parser = argparse.ArgumentParser()
     parser.add_argument('fname', type=str,
         help='Root TLA+ module file name')
+    parser.add_argument('--cache', action='store_true',
+        help='reuse dependencies stored in `{f}`'.format(f=CACHE_FILE))
+    parser.add_argument('-I', '--include', action='append',
+        default=list(), metavar='DIR',
+        help='search for modules also in this directory '
+             '(for example, the TLAPS library); can be repeated')
+    parser.add_argument('-o', '--output', action='append',
+        metavar='FILE',
+        help='write the graph to this file, in the format of its '
+             'extension: `.pdf`, `.svg`, `.png` (rendered by '
+             'Graphviz), `.dot`, `.graphml`, or `.jsonl`; '
+             'can be repeated (default: `{f}`)'.format(
+                f=DEPENDENCY_GRAPH))
     args = parser.parse_args()
-    return args.fname
+    cache_file = CACHE_FILE if args.cache else None
+    return args.fname, cache_file, args.include, args.output
 
 
 if __name__ == '__main__':
-    fname = parse_args()
-    dump_dependency_graph(fname)
+    fname, cache_file, search_path, outputs = parse_args()
+    dump_dependency_graph(fname, cache_file, search_path, outputs)
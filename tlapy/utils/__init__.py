@@ -0,0 +1 @@
+"""Utilities for TLA+ files."""
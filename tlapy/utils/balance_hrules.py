@@ -1,9 +1,14 @@
 #!/usr/bin/env python
 """Rewrite title and horizontal rules to fill the column width."""
 import argparse
+import concurrent.futures
+import json
 import logging
 import math
-import re
+import os
+
+from tlapy import file_io
+from tlapy import lexer
 
 
 DEFAULT_COLUMN_WIDTH = 80
@@ -11,42 +16,85 @@ log = logging.getLogger(__name__)
 
 
 def main(fname, fout, column_width):
+    """Balance the rules of `fname`, and write the result to `fout`.
+
+    The file `fout` is replaced atomically,
+    and only if its contents change.
+
+    @return: `True` if `fout` was written
+    """
     with open(fname, 'r') as f:
         lines = f.readlines()
-    eof_newline = lines[-1].endswith('\n')
+    eof_newline = bool(lines) and lines[-1].endswith('\n')
     lines = [line.rstrip('\n') for line in lines]
     new_lines = _balance_lines(lines, column_width)
     s = '\n'.join(new_lines)
     if eof_newline:
         s += '\n'
-    with open(fout, 'w') as f:
-        f.write(s)
+    if os.path.isfile(fout):
+        with open(fout, 'r') as f:
+            if f.read() == s:
+                return False
+    file_io.write_file(fout, s)
+    return True
+
+
+def balance_tree(paths, column_width, jobs=1):
+    """Balance in place the rules of files in `paths`.
+
+    Directories in `paths` are replaced by the `*.tla`
+    files below them. Files are processed `jobs` at a time.
+
+    @return: `dict` with the names of the files that changed
+        (`'changed'`), and the error message for each file
+        that could not be balanced (`'failed'`)
+    """
+    if jobs < 1:
+        raise ValueError(jobs)
+    files = list(file_io.tree_files(paths))
+    changed = list()
+    failed = dict()
+    with concurrent.futures.ProcessPoolExecutor(
+            max_workers=jobs) as executor:
+        futures = [
+            executor.submit(main, fname, fname, column_width)
+            for fname in files]
+        for fname, future in zip(files, futures):
+            try:
+                if future.result():
+                    changed.append(fname)
+            except Exception as e:
+                failed[fname] = '{t}: {e}'.format(
+                    t=type(e).__name__, e=e)
+    return dict(changed=changed, failed=failed)
 
 
 def _balance_lines(lines, column_width):
     new_lines = list()
-    for line in lines:
-        new_line = _balance_line(line, column_width)
+    for line, tokens in lexer.tokenize_lines(lines):
+        new_line = _balance_line(line, tokens, column_width)
         _log_change(line, new_line)
         new_lines.append(new_line)
     return new_lines
 
 
-def _balance_line(line, column_width):
-    if 'MODULE' in line:
-        return _balance_title(line, column_width)
-    assert 'MODULE' not in line, line
-    if '----' in line:
-        return _balance_hrule(line, '-', column_width)
-    if '====' in line:
-        return _balance_hrule(line, '=', column_width)
+def _balance_line(line, tokens, column_width):
+    """Return `line` balanced, if it contains only a title or rule.
+
+    Rules inside comments are unchanged.
+    """
+    if len(tokens) != 1 or tokens[0].column != 0:
+        return line
+    tok, = tokens
+    if tok.kind == 'module':
+        return _balance_title(tok, column_width)
+    if tok.kind == 'rule':
+        return _balance_hrule(tok.text, tok.text[0], column_width)
     return line
 
 
-def _balance_title(line, column_width):
-    rt = '-----*\s*MODULE\s*([a-zA-Z0-9_]*)\s*-----*'
-    m = re.match(rt, line)
-    module_name, = m.groups()
+def _balance_title(tok, column_width):
+    module_name = lexer.module_name(tok)
     title = ' MODULE {name} '.format(name=module_name)
     n_dashes = column_width - len(title)
     half = n_dashes / 2
@@ -86,13 +134,25 @@ def _parse_args():
     p.add_argument('-w', '--column-width', type=int,
                    default=DEFAULT_COLUMN_WIDTH,
                    help='desired text width in characters')
+    p.add_argument('--tree', nargs='+', type=str, metavar='PATH',
+                   help='balance in place these files, and the '
+                        '`*.tla` files in these directories, and print '
+                        'a JSON object with the files that changed')
+    file_io.add_jobs_argument(
+        p, 'number of files to balance in parallel')
     args = p.parse_args()
-    fin = args.input
-    fout = args.output
-    column_width = args.column_width
-    return fin, fout, column_width
+    if args.tree is None and (args.input is None or args.output is None):
+        p.error('give `--input` and `--output`, or `--tree`')
+    return args
+
 
 if __name__ == '__main__':
-    logging.basicConfig(level=logging.DEBUG)
-    fin, fout, column_width = _parse_args()
-    main(fin, fout, column_width)
+    args = _parse_args()
+    if args.tree is None:
+        logging.basicConfig(level=logging.DEBUG)
+        main(args.input, args.output, args.column_width)
+    else:
+        report = balance_tree(args.tree, args.column_width, args.jobs)
+        print(json.dumps(report, indent=2))
+        if report['failed']:
+            raise SystemExit(1)
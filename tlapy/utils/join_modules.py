@@ -4,11 +4,16 @@
 # All rights reserved. Licensed under 3-clause BSD.
 #
 import argparse
+import hashlib
+import io
 import os
 import shutil
 import subprocess
 
-from PyPDF2 import PdfFileReader
+from PyPDF2 import PdfReader
+from PyPDF2 import PdfWriter
+
+from tlapy import file_io
 
 
 START = r'''
@@ -31,45 +36,138 @@ MIDDLE_2 = r'''
 \verbatiminput{./LICENSE}
 \newpage
 '''
+LICENSE_PAGE = r'''
+\newpage
+\verbatiminput{./LICENSE}
+'''
 END = r'''
 \end{document}
 '''
 MERGED_FILE = 'merged_tla_modules.pdf'
 AUXDIR = '__tlacache__/.aux'
+MANIFEST_FILE = '__tlacache__/join_modules_manifest.json'
 LICENSE = 'LICENSE'
 DEFAULT_TITLE = r'TLA\textsuperscript{+} modules'
+FRONT_MATTER = 'front_matter.tex'
 
 
-def join_modules():
-    paths, author_name, title_str, date_str, abstract = parse_args()
-    lines = list()
+def main():
+    """Entry point."""
+    paths, author_name, title_str, date_str, abstract, latex = parse_args()
+    join_modules(
+        paths, author_name, title_str, date_str, abstract, latex)
+
+
+def join_modules(
+        paths, author_name=None, title_str=None,
+        date_str=None, abstract=None, latex=False):
+    """Concatenate the PDF files `paths` into `MERGED_FILE`.
+
+    By default, the pages of `paths` are copied after the front matter
+    (title, abstract, and license), with a bookmark for each module.
+    Only the front matter is typeset with LaTeX, and only when it changes.
+
+    The digests and page counts of `paths` are recorded in `MANIFEST_FILE`.
+    If neither `paths` nor the front matter changed since `MERGED_FILE`
+    was written, then `MERGED_FILE` is not written again.
+
+    @param latex: if `True`, then concatenate by typesetting a document
+        that includes the pages of `paths` using `pdfpages`,
+        with a table of contents
+    """
+    os.makedirs(AUXDIR, exist_ok=True)
     for path in paths:
-        stem, fname = os.path.split(path)
-        assert not stem, stem  # relative path
-        name, ext = os.path.splitext(fname)
+        _, ext = os.path.splitext(path)
         assert ext == '.pdf', path
-        # front matter
-        title = name.replace('_', r'\_')
-        pdf = PdfFileReader(open(path, 'rb'))
-        page_count = pdf.getNumPages()
-        if page_count > 1:
-            include_rest = '\includepdf[pages=2-]{' + fname + '}'
-        else:
-            include_rest = ''
-        more_lines = [
-            '\includepdf[pages=1,pagecommand={\phantomsection ' +
-            '\\addcontentsline{toc}{section}{' + title +
-            '} }]{' + fname + '}',
-            include_rest]
-        lines.extend(more_lines)
-        # copy file to aux dir
-        target = os.path.join(AUXDIR, fname)
-        print(target)
-        shutil.copy(path, target)
+    manifest = _load_manifest()
+    old_files = dict(manifest['files'])
+    files = {path: _input_entry(path, old_files) for path in paths}
+    preamble = _preamble(author_name, title_str, date_str, abstract)
+    inputs = [
+        fname for fname in (LICENSE, abstract)
+        if fname is not None and os.path.isfile(fname)]
+    if latex:
+        source = preamble + MIDDLE_2
+    elif LICENSE in inputs:
+        source = preamble + LICENSE_PAGE + END
+    else:
+        source = preamble + END
+    front_digest = _front_matter_digest(source, inputs)
+    key = _merge_key(latex, front_digest, paths, files)
+    manifest['files'].update(files)
+    if _is_merged(key, manifest['merged']):
+        print('`{f}` is up to date.'.format(f=MERGED_FILE))
+        file_io.dump_json(MANIFEST_FILE, manifest)
+        return
+    if latex:
+        _join_with_latex(paths, source, files, old_files)
+    else:
+        front_matter = _typeset_front_matter(
+            source, front_digest, manifest)
+        _merge_pdfs(front_matter, paths, MERGED_FILE)
+    st = os.stat(MERGED_FILE)
+    manifest['merged'] = dict(
+        key=key, size=st.st_size, mtime_ns=st.st_mtime_ns)
+    file_io.dump_json(MANIFEST_FILE, manifest)
+
+
+def _input_entry(path, old_files):
+    """Return manifest entry for the PDF file `path`.
+
+    The digest and page count are reused from `old_files`
+    if the size and modification time of `path` are unchanged.
+    """
+    st = os.stat(path)
+    old = old_files.get(path)
+    if (old is not None and
+            old['size'] == st.st_size and
+            old['mtime_ns'] == st.st_mtime_ns):
+        return old
+    with open(path, 'rb') as f:
+        pages = len(PdfReader(f).pages)
+    return dict(
+        size=st.st_size, mtime_ns=st.st_mtime_ns,
+        digest=file_io.file_digest(path), pages=pages)
+
+
+def _merge_key(latex, front_digest, paths, files):
+    """Return digest of everything that `MERGED_FILE` depends on."""
+    h = hashlib.sha256()
+    h.update('{latex}\0{front}'.format(
+        latex=latex, front=front_digest).encode())
+    for path in paths:
+        h.update('\0{p}\0{d}'.format(
+            p=path, d=files[path]['digest']).encode())
+    return h.hexdigest()
+
+
+def _is_merged(key, merged):
+    """Return `True` if `MERGED_FILE` was written with `key`."""
+    if merged is None or merged['key'] != key:
+        return False
+    if not os.path.isfile(MERGED_FILE):
+        return False
+    st = os.stat(MERGED_FILE)
+    return (
+        merged['size'] == st.st_size and
+        merged['mtime_ns'] == st.st_mtime_ns)
+
+
+def _load_manifest():
+    """Return manifest from `MANIFEST_FILE`, or an empty one."""
+    manifest = file_io.load_json(MANIFEST_FILE) or dict()
+    manifest.setdefault('files', dict())
+    manifest.setdefault('front_matter', None)
+    manifest.setdefault('merged', None)
+    return manifest
+
+
+def _preamble(author_name, title_str, date_str, abstract):
+    """Return LaTeX up to the abstract, and copy files to `AUXDIR`."""
     if os.path.isfile(LICENSE):
         target = os.path.join(AUXDIR, LICENSE)
         shutil.copy(LICENSE, target)
-    if os.path.isfile(abstract):
+    if abstract is not None and os.path.isfile(abstract):
         target = os.path.join(AUXDIR, abstract)
         shutil.copy(abstract, target)
     if title_str is None:
@@ -88,21 +186,127 @@ def join_modules():
     else:
         abstract = (r'\begin{abstract}\input{' + abstract +
             r'} \end{abstract}')
-    latex = (
-        START + title + date + author + MIDDLE + abstract +
-        MIDDLE_2 + '\n'.join(lines) + END)
+    return START + title + date + author + MIDDLE + abstract
+
+
+def _join_with_latex(paths, source, files, old_files):
+    """Concatenate `paths` by typesetting with `pdfpages`.
+
+    Only files that changed since they were recorded in
+    `old_files` are copied to `AUXDIR`.
+    """
+    lines = list()
+    for path in paths:
+        name = _module_name(path)
+        fname = _aux_name(path)
+        # front matter
+        title = name.replace('_', r'\_')
+        entry = files[path]
+        if entry['pages'] > 1:
+            include_rest = r'\includepdf[pages=2-]{' + fname + '}'
+        else:
+            include_rest = ''
+        more_lines = [
+            r'\includepdf[pages=1,pagecommand={\phantomsection ' +
+            r'\addcontentsline{toc}{section}{' + title +
+            '} }]{' + fname + '}',
+            include_rest]
+        lines.extend(more_lines)
+        # copy file to aux dir
+        target = os.path.join(AUXDIR, fname)
+        old = old_files.get(path)
+        if (os.path.isfile(target) and old is not None and
+                old['digest'] == entry['digest']):
+            continue
+        print(target)
+        shutil.copy(path, target)
+    latex = source + '\n'.join(lines) + END
     # typeset using XeLaTeX
     name, ext = os.path.splitext(MERGED_FILE)
     assert ext == '.pdf', MERGED_FILE
+    _typeset(name, latex)
+    # copy merged PDF to current dir
+    path = os.path.join(AUXDIR, MERGED_FILE)  # merged PDF
+    shutil.copy(path, MERGED_FILE)
+
+
+def _module_name(path):
+    """Return name of module typeset in PDF file `path`."""
+    name, _ = os.path.splitext(os.path.basename(path))
+    return name
+
+
+def _aux_name(path):
+    """Return name of the copy of `path` in `AUXDIR`.
+
+    Files outside the current directory are prefixed with
+    the digest of their directory, so that copies of files
+    from different directories do not collide.
+    """
+    head, tail = os.path.split(os.path.normpath(path))
+    if not head:
+        return tail
+    h = hashlib.sha256(head.encode()).hexdigest()[:8]
+    return '{h}_{t}'.format(h=h, t=tail)
+
+
+def _front_matter_digest(latex, inputs):
+    """Return digest of `latex` and of the files `inputs`."""
+    h = hashlib.sha256(latex.encode())
+    for fname in inputs:
+        h.update(('\0' + file_io.file_digest(fname)).encode())
+    return h.hexdigest()
+
+
+def _typeset_front_matter(latex, digest, manifest):
+    """Return PDF file of front matter, typeset if `digest` changed."""
+    name, _ = os.path.splitext(FRONT_MATTER)
+    pdf = os.path.join(AUXDIR, name + '.pdf')
+    if os.path.isfile(pdf) and manifest['front_matter'] == digest:
+        return pdf
+    if os.path.isfile(pdf):
+        os.remove(pdf)
+    _typeset(name, latex)
+    if not os.path.isfile(pdf):
+        raise RuntimeError(
+            'Typesetting the front matter failed, see `{log}`.'.format(
+                log=os.path.join(AUXDIR, name + '.log')))
+    manifest['front_matter'] = digest
+    return pdf
+
+
+def _typeset(name, latex):
+    """Typeset `latex` as `name.tex` in `AUXDIR` using XeLaTeX."""
     fname = name + '.tex'
     path = os.path.join(AUXDIR, fname)
     with open(path, 'w') as f:
         f.write(latex)
     cmd = ['xelatex', '--interaction=nonstopmode', fname]
     subprocess.call(cmd, cwd=AUXDIR)
-    # copy merged PDF to current dir
-    path = os.path.join(AUXDIR, MERGED_FILE)  # merged PDF
-    shutil.copy(path, MERGED_FILE)
+
+
+def _merge_pdfs(front_matter, paths, fname):
+    """Write pages of `front_matter` and `paths` to `fname`.
+
+    Each file in `paths` gets a bookmark named after the module.
+    Each file is read into memory and closed before the next
+    is opened, so the number of open files does not grow
+    with the number of modules.
+    """
+    writer = PdfWriter()
+    for path in [front_matter] + list(paths):
+        # the pages are read when writing
+        with open(path, 'rb') as f:
+            data = io.BytesIO(f.read())
+        pdf = PdfReader(data)
+        start = len(writer.pages)
+        for page in pdf.pages:
+            writer.add_page(page)
+        if path == front_matter:
+            continue
+        writer.add_outline_item(_module_name(path), start)
+    with file_io.atomic_open(fname, 'wb') as f:
+        writer.write(f)
 
 
 def parse_args():
@@ -117,11 +321,14 @@ def parse_args():
                    help='Document date')
     p.add_argument('--abstract', type=str,
                    help='Document abstract')
+    p.add_argument('--latex', action='store_true',
+                   help='concatenate using LaTeX, '
+                        'with a table of contents')
     args = p.parse_args()
     return (
         args.files, args.author, args.title,
-        args.date, args.abstract)
+        args.date, args.abstract, args.latex)
 
 
 if __name__ == '__main__':
-    join_modules()
+    main()
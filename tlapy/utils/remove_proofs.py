@@ -1,86 +1,204 @@
 #!/usr/bin/env python
-"""Remove proofs from a TLA+ file to create a "header"."""
+"""Remove proofs from a TLA+ file to create a "header".
+
+The digest of each proofs file is recorded in `MANIFEST_FILE`,
+together with the size and modification time of its header.
+A header is regenerated only if its proofs file or the header
+changed since then, and written only if its contents change,
+so changes to proofs alone leave the header untouched.
+"""
 # Copyright 2017 by California Institute of Technology
 # All rights reserved. Licensed under 3-clause BSD.
 #
 from __future__ import division
 import argparse
+import concurrent.futures
 import math
 import logging
 import os
-import re
+
+from tlapy import file_io
+from tlapy import lexer
 
 
 PROOF_SUFFIX = '_proofs'
 HEADER_SUFFIX = '_header'
+# notice that header has been auto-generated
+BANNER = (
+    '(* This file was automatically generated from the file:\n'
+    '    "{f}"\n'
+    '*)\n')
+MANIFEST_FILE = '__tlacache__/remove_proofs_manifest.json'
 log = logging.getLogger(__name__)
 
 
 def main():
     """Entry point."""
-    files, outdir = _parse_args()
-    for fname in files:
-        _remove_proofs(fname, outdir)
+    files, outdir, jobs = _parse_args()
+    remove_proofs_files(files, outdir, jobs)
+
 
+def remove_proofs_files(files, outdir='.', jobs=1):
+    """Create headers from `files`, processing `jobs` at a time.
 
-def _remove_proofs(fname, outdir):
-    """Remove proofs from `fname` and dump result."""
+    @return: names of headers written, in the order of `files`
+    @rtype: `list` of `str`
+    """
+    if jobs < 1:
+        raise ValueError(jobs)
+    manifest = _load_manifest()
+    headers = [header_file_name(fname, outdir) for fname in files]
+    entries = [manifest['files'].get(h) for h in headers]
+    if jobs == 1:
+        results = [
+            _remove_proofs(fname, outdir, entry)
+            for fname, entry in zip(files, entries)]
+    else:
+        with concurrent.futures.ProcessPoolExecutor(
+                max_workers=jobs) as executor:
+            futures = [
+                executor.submit(_remove_proofs, fname, outdir, entry)
+                for fname, entry in zip(files, entries)]
+            results = [future.result() for future in futures]
+    for header_path, (_, entry) in zip(headers, results):
+        manifest['files'][header_path] = entry
+    file_io.dump_json(MANIFEST_FILE, manifest)
+    return [
+        header_path
+        for header_path, (written, _) in zip(headers, results)
+        if written]
+
+
+def header_file_name(fname, outdir='.'):
+    """Return path of header generated from `fname`."""
     base, ext = os.path.splitext(fname)
     assert ext == '.tla', ext
     assert base.endswith(PROOF_SUFFIX), base
+    new_module = base[:-len(PROOF_SUFFIX)] + HEADER_SUFFIX
+    return os.path.normpath(os.path.join(outdir, new_module + '.tla'))
+
+
+def remove_proofs(fname, outdir='.'):
+    """Remove proofs from `fname` and dump result.
+
+    @return: `True` if the header was written
+    """
+    return bool(remove_proofs_files([fname], outdir))
+
+
+def _remove_proofs(fname, outdir, entry):
+    """Create header from `fname`, unless up to date.
+
+    @param entry: manifest entry of the header, or `None`
+    @return: `(written, entry)`, where `written` is `True`
+        if the header was written, and `entry` is the new
+        manifest entry of the header
+    """
+    digest = file_io.file_digest(fname)
+    header_path = header_file_name(fname, outdir)
+    if _is_up_to_date(header_path, digest, entry):
+        log.info('header "{h}" is up to date'.format(h=header_path))
+        return False, entry
+    content = BANNER.format(f=fname) + _header_text(fname)
+    written = content != _load_header(header_path)
+    if written:
+        print('Dump header to file "{h}"'.format(h=header_path))
+        file_io.write_file(header_path, content)
+    else:
+        log.info('header "{h}" is unchanged'.format(h=header_path))
+    st = os.stat(header_path)
+    entry = dict(
+        digest=digest, size=st.st_size, mtime_ns=st.st_mtime_ns)
+    return written, entry
+
+
+def _is_up_to_date(header_path, digest, entry):
+    """Return `True` if the header was generated from `digest`.
+
+    The header must also be unchanged since it was recorded.
+    """
+    if entry is None or entry['digest'] != digest:
+        return False
+    try:
+        st = os.stat(header_path)
+    except FileNotFoundError:
+        return False
+    return (
+        entry['size'] == st.st_size and
+        entry['mtime_ns'] == st.st_mtime_ns)
+
+
+def _header_text(fname):
+    """Return `fname` without proofs, with the module renamed."""
+    base, _ = os.path.splitext(fname)
     with open(fname, 'r') as f:
-        lines = f.readlines()
+        lines = list(lexer.tokenize_lines(f))
     new_lines = list()
     inside_proof = False
     last_indent = 0
-    for line in lines:
+    header = None  # index of module header in `new_lines`
+    for line, tokens in lines:
         assert '\t' not in line, line
         s = line.lstrip()
         indent = len(line) - len(s)
         is_dedent = indent <= last_indent
         if is_dedent:
             inside_proof = False
-        if re.match('<\d+>', s) is None:
+        if not _starts_step(tokens):
             if inside_proof:
                 continue
+            if header is None and any(t.kind == 'module' for t in tokens):
+                header = len(new_lines)
             new_lines.append(line)
             continue
         inside_proof = True  # omit lines
     # rename module by removing "_proofs"
-    line = new_lines[0]
+    assert header is not None, fname
+    line = new_lines[header]
     assert 'MODULE' in line, line
-    assert base in line, line
-    new_module = base.replace(PROOF_SUFFIX, HEADER_SUFFIX)
-    old_len = len(base) - len(PROOF_SUFFIX) + len(HEADER_SUFFIX)
-    assert len(new_module) == old_len, (new_module, base)
-    new_ln = line.replace(base, new_module)
+    module = os.path.basename(base)
+    assert module in line, line
+    new_module = module.replace(PROOF_SUFFIX, HEADER_SUFFIX)
+    old_len = len(module) - len(PROOF_SUFFIX) + len(HEADER_SUFFIX)
+    assert len(new_module) == old_len, (new_module, module)
+    new_ln = line.replace(module, new_module)
     # add dashes
-    missing_dashes = len(base) - len(new_module)
+    missing_dashes = len(module) - len(new_module)
     half = missing_dashes / 2
     n = int(math.floor(half))
     m = int(math.ceil(half))
     assert n + m == missing_dashes, (n, m, missing_dashes)
     new_ln = n * '-' + new_ln[:-1] + m * '-' + '\n'
     assert len(new_ln) == len(line), (new_ln, line)
-    new_lines[0] = new_ln
-    # add notice that header has been auto-generated
-    text = (
-        '(* This file was automatically generated '
-        'from the file:\n')
-    line = (text + '    "{f}"\n*)\n').format(f=fname)
-    new_lines.insert(0, line)
+    new_lines[header] = new_ln
+    return ''.join(new_lines)
+
+
+def _load_header(header_path):
+    """Return contents of header, or `None` if it does not exist."""
+    if not os.path.isfile(header_path):
+        return None
+    with open(header_path, 'r') as f:
+        s = f.read()
     # avoid overwriting source files
-    header_fname = new_module + '.tla'
-    header_path = os.path.join(outdir, header_fname)
-    if os.path.isfile(header_path):
-        with open(header_path, 'r') as f:
-            line = f.readline()
-        assert line.startswith(text), (line, text)
-    # dump header
-    print('Dump header to file "{h}"'.format(h=header_path))
-    content = ''.join(new_lines)
-    with open(header_path, 'w') as f:
-        f.write(content)
+    text, _, _ = BANNER.partition('\n')
+    assert s.startswith(text), (s[:len(text)], text)
+    return s
+
+
+def _load_manifest():
+    """Return manifest from `MANIFEST_FILE`, or an empty one."""
+    manifest = file_io.load_json(MANIFEST_FILE) or dict()
+    manifest.setdefault('files', dict())
+    return manifest
+
+
+def _starts_step(tokens):
+    """Return `True` if the first of `tokens` names a proof step."""
+    if not tokens or tokens[0].kind != 'step':
+        return False
+    level, _ = lexer.step_name(tokens[0])
+    return level.isdigit()
 
 
 def _parse_args():
@@ -90,12 +208,14 @@ def _parse_args():
                    help="input `*.tla` files")
     p.add_argument('-o', '--outdir', type=str, default='.',
                    help='output directory')
+    file_io.add_jobs_argument(
+        p, 'number of files to process in parallel')
     args = p.parse_args()
     files = args.input
     outdir = args.outdir
     log.info('input files: {fs}'.format(fs=files))
     log.info('output directory: {d}'.format(d=outdir))
-    return files, outdir
+    return files, outdir, args.jobs
 
 
 if __name__ == '__main__':
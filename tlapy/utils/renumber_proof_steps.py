@@ -1,59 +1,211 @@
 #!/usr/bin/env python
-"""Renumber the proof steps in a TLA+ module."""
-import collections
+"""Renumber the proof steps in a TLA+ module.
+
+Usage:
+
+    renumber_proof_steps.py --in-place Foo.tla Bar.tla:120-480 Baz.tla:Thm
+
+renumbers all of `Foo.tla`, lines 120 to 480 of `Bar.tla`,
+and the proof of theorem `Thm` in `Baz.tla`.
+A file is written only if renumbering changes it.
+"""
+import argparse
+import concurrent.futures
+import os
 import re
 
+from tlapy import file_io
+from tlapy import lexer
+
+
+# keywords that start a new proof, at the start of a line
+THEOREMS = {'THEOREM', 'LEMMA', 'PROPOSITION', 'COROLLARY'}
+# lines that end the proof of a theorem
+UNIT = re.compile(r'''
+    (?: THEOREM | LEMMA | PROPOSITION | COROLLARY | AXIOM
+        | ASSUME | ASSUMPTION | CONSTANTS? | VARIABLES?
+        | LOCAL | INSTANCE | ----+ | ====+ ) (?! \w )
+    | \w+ [ \t]* (?: \( [^)]* \) )? [ \t]* ==
+    ''', re.VERBOSE)
+LINE_RANGE = re.compile(r'(?P<start>\d+)-(?P<end>\d*)')
+
+
+def main():
+    """Entry point."""
+    files, outdir, jobs = _parse_args()
+    changed = renumber_files(files, outdir, jobs)
+    for fname in changed:
+        print('renumbered "{f}"'.format(f=fname))
+
+
+def renumber_files(files, outdir=None, jobs=1):
+    """Renumber proof steps in `files`, processing `jobs` at a time.
 
-# TODO: renumber proof levels 2..5
-# This renumbering could be obtained by counting from 1 and restarting the
-# count whenever a new level 1 step name is encountered.
+    @param files: `dict` that maps file names to
+        ranges as for `renumber_file`
+    @param outdir: as for `renumber_file`
+    @return: names of files written, in the order of `files`
+    @rtype: `list` of `str`
+    """
+    if jobs < 1:
+        raise ValueError(jobs)
+    if jobs == 1:
+        written = [
+            renumber_file(fname, ranges, outdir)
+            for fname, ranges in files.items()]
+    else:
+        with concurrent.futures.ProcessPoolExecutor(
+                max_workers=jobs) as executor:
+            futures = [
+                executor.submit(renumber_file, fname, ranges, outdir)
+                for fname, ranges in files.items()]
+            written = [future.result() for future in futures]
+    return [fname for fname in written if fname is not None]
 
 
-def main(fname, start_line, end_line):
+def renumber_file(fname, ranges=None, outdir=None):
+    """Renumber proof steps in `fname`, and write the result.
+
+    @param ranges: `list` of ranges to renumber, each either
+        a pair `(start, end)` of line numbers (starting from 1,
+        `end` inclusive, or `None` for the last line), or the name
+        of a theorem. If `None`, then the whole file is renumbered.
+    @param outdir: directory where the result is written,
+        or `None` to write the result to `fname`
+    @return: name of the file written, or `None` if the result
+        is the same as that file
+    """
     with open(fname, 'r') as f:
         lines = f.readlines()
-    lines = lines[start_line : end_line]
-    spec = ''.join(lines)
-    # print(spec)
-    level = 1
-    pattern = '<{level}>\d+\.'.format(level=level)
-    step_names = re.findall(pattern, spec)
-    mapping = rename_steps(step_names, suffix='temp', level=level)
-    s = replace_step_names(mapping, spec)
-    # print(s)
-    temp_names = [
-        v for v in mapping.values()
-        if v.endswith('.')]
-    new_names = rename_steps(temp_names)
-    s = replace_step_names(new_names, s)
-    with open('input.tla', 'w') as f:
-        f.write(spec)
-    return s
-
-
-def rename_steps(step_names, suffix='', level=1):
-    renaming = collections.OrderedDict()
-    for i, name in enumerate(step_names, 1):
-        new_name = '<{level}>{i}{temp}'.format(
-            level=level, i=i, temp=suffix)
-        # renaming the definition of the step name
-        renaming[name] = new_name + '.'
-        # renaming references to the step name
-        old_ref = name[:-1] + ' '
-        new_ref = new_name + ' '
-        renaming[old_ref] = new_ref
-    return renaming
-
-def replace_step_names(step_names, s):
-    for old, new in step_names.items():
-        s = s.replace(old, new)
-    return s
+    if ranges is None:
+        ranges = [(1, None)]
+    for r in ranges:
+        if isinstance(r, str):
+            start, end = _theorem_lines(lines, r)
+        else:
+            start, end = r
+            start -= 1
+        spec = ''.join(lines[start:end])
+        lines[start:end] = renumber_steps(spec).splitlines(True)
+    s = ''.join(lines)
+    if outdir is None:
+        target = fname
+    else:
+        _, tail = os.path.split(fname)
+        target = os.path.join(outdir, tail)
+    if os.path.isfile(target):
+        with open(target, 'r') as f:
+            if f.read() == s:
+                return None
+    file_io.write_file(target, s)
+    return target
+
+
+def _theorem_lines(lines, name):
+    """Return first line and end of the proof of theorem `name`.
+
+    @return: `(start, end)` as indices of `lines`
+    """
+    theorem = re.compile(
+        r'(?:THEOREM|LEMMA|PROPOSITION|COROLLARY)\s+' +
+        re.escape(name) + r'(?!\w)')
+    starts = [i for i, line in enumerate(lines) if theorem.match(line)]
+    if not starts:
+        raise ValueError(
+            'No theorem named `{name}` found.'.format(name=name))
+    start = starts[0]
+    for end in range(start + 1, len(lines)):
+        if UNIT.match(lines[end]):
+            return start, end
+    return start, len(lines)
+
+
+def renumber_steps(spec):
+    """Return `spec` with proof steps numbered in increasing order.
+
+    Within each proof, the steps of each level are numbered
+    1, 2, ... in the order that they appear, and references
+    to steps are renamed accordingly, in a single pass over `spec`.
+    A step name that is the first token on a line names a step,
+    other step names are references.
+    Numbering restarts at each `THEOREM`, `LEMMA`, `PROPOSITION`,
+    or `COROLLARY` at the start of a line.
+    Step names that are not numbers, like `<1>a`, and step names
+    in comments and strings are unchanged.
+    """
+    # maps each level to a count of steps and
+    # a `dict` from old to new numbers of steps
+    scopes = dict()
+    pieces = list()
+    for line, tokens in lexer.tokenize_lines(spec.splitlines(True)):
+        i = 0
+        for tok in tokens:
+            if (tok.kind == 'word' and tok.column == 0 and
+                    tok.text in THEOREMS):
+                scopes.clear()
+            if tok.kind != 'step':
+                continue
+            level, label = lexer.step_name(tok)
+            if not (level.isdigit() and label.isdigit()):
+                continue
+            k = int(level)
+            if tok is tokens[0]:
+                # the subproofs of previous steps have ended
+                for j in [j for j in scopes if j > k]:
+                    del scopes[j]
+                count, names = scopes.get(k, (0, dict()))
+                count += 1
+                names[label] = str(count)
+                scopes[k] = (count, names)
+                new = str(count)
+            else:  # reference
+                _, names = scopes.get(k, (0, dict()))
+                new = names.get(label, label)
+            # the period after the name of a step is kept
+            rest = tok.text[len(level) + len(label) + 2:]
+            pieces.append(line[i:tok.column])
+            pieces.append('<{k}>{i}{rest}'.format(
+                k=level, i=new, rest=rest))
+            i = tok.column + len(tok.text)
+        pieces.append(line[i:])
+    return ''.join(pieces)
+
+
+def _parse_args():
+    """Return files with ranges, output directory, and jobs."""
+    p = argparse.ArgumentParser(
+        description='Renumber the proof steps in TLA+ modules.')
+    p.add_argument('files', nargs='+', type=str,
+                   help='`*.tla` files, each optionally followed by '
+                        '`:START-END` (lines) or `:NAME` (theorem). '
+                        'A file can be given more than once.')
+    out = p.add_mutually_exclusive_group(required=True)
+    out.add_argument('--in-place', action='store_true',
+                     help='overwrite the input files')
+    out.add_argument('--outdir', type=str,
+                     help='directory for renumbered files')
+    file_io.add_jobs_argument(
+        p, 'number of files to renumber in parallel')
+    args = p.parse_args()
+    files = dict()
+    for arg in args.files:
+        fname, _, r = arg.partition(':')
+        if not r:
+            files[fname] = None
+            continue
+        ranges = files.setdefault(fname, list())
+        if ranges is None:  # whole file
+            continue
+        m = LINE_RANGE.fullmatch(r)
+        if m is None:
+            ranges.append(r)
+        else:
+            end = int(m.group('end')) if m.group('end') else None
+            ranges.append((int(m.group('start')), end))
+    if args.outdir is not None:
+        os.makedirs(args.outdir, exist_ok=True)
+    return files, args.outdir, args.jobs
 
 
 if __name__ == '__main__':
-    fname = 'demo.tla'
-    start_line = 1300
-    end_line = 3500
-    spec = main(fname, start_line, end_line)
-    with open('renumbered.tla', 'w') as f:
-        f.write(spec)
+    main()
@@ -2,35 +2,151 @@
 """Replace pairs of backticks `...` with `...'.
 
 This replacement converts inline Markdown code blocks to TLA inline code blocks.
+Multi-line Markdown code blocks that are delimited by ``` are converted
+to preformatted blocks of `tla2tex`, delimited by `. and .'.
+Backticks inside these blocks are unchanged.
+Spans that are already converted, `...' and `. ... .', are unchanged,
+so converting a file again does not change it.
+Only backticks in comments, and in the text before and after
+the module, are replaced.
+
+The input is read and written one line at a time.
 """
-# TODO: consider converting also multi-line Markdown code blocks that are
-#       delimited by ```.
 import argparse
+import contextlib
+import itertools
+import re
+import sys
+
+from tlapy import file_io
+from tlapy import lexer
+
+
+# a fence, with an optional info string, the start or end
+# of a preformatted block, a backtick, or a quote
+BACKTICK = re.compile(r"```[\w+-]*|`\.(?=\s|$)|`|\.'|'")
+OPEN_BLOCK = '`.'
+CLOSE_BLOCK = ".'"
+
+
+def main():
+    """Entry point."""
+    fin, fout, paths, inplace = _parse_args()
+    if not inplace:
+        convert(fin, fout)
+        return
+    for fname in file_io.tree_files(paths):
+        if convert_inplace(fname):
+            print(fname)
+
+
+def replace_backticks(lines):
+    """Yield `lines` with even backticks (`\\``) replaced by `'`.
+
+    A backtick that closes a span `...` is replaced.
+    A span closed by a quote, `...', is already converted.
+
+    @param lines: iterable of `str`
+    """
+    in_span = False  # after the backtick that opens a span
+    in_fence = False  # between ``` fences
+    in_block = False  # between `. and .'
 
+    def replace(m):
+        nonlocal in_span, in_fence, in_block
+        token = m.group(0)
+        if token.startswith('```'):
+            in_fence = not in_fence
+            return OPEN_BLOCK if in_fence else CLOSE_BLOCK
+        if in_fence:
+            return token
+        if in_block:
+            in_block = (token != CLOSE_BLOCK)
+            return token
+        if in_span:
+            in_span = False
+            # `x`. closes the span before a period
+            if token.startswith('`'):
+                return "'" + token[1:]
+            return token
+        if token == OPEN_BLOCK:
+            in_block = True
+        elif token == '`':
+            in_span = True
+        return token
 
-def main(fname):
-    """Replace even backticks (`\\``) with `'`."""
+    for line, tokens in lexer.tokenize_lines(lines, prose=True):
+        pieces = list()
+        i = 0
+        for tok in tokens:
+            if tok.kind != 'comment':
+                continue
+            pieces.append(line[i:tok.column])
+            pieces.append(BACKTICK.sub(replace, tok.text))
+            i = tok.column + len(tok.text)
+        pieces.append(line[i:])
+        yield ''.join(pieces)
+
+
+def convert(fin=None, fout=None):
+    """Replace even backticks in file `fin`, and write to `fout`.
+
+    @param fin, fout: file names, or `None` for
+        standard input and output
+    """
+    with _open(fin, 'r', sys.stdin) as f, _open(fout, 'w', sys.stdout) as g:
+        for line in replace_backticks(f):
+            g.write(line)
+
+
+def convert_inplace(fname):
+    """Replace even backticks in `fname`, if any.
+
+    The file is replaced atomically, and only if it changes.
+    The file is read once to find a change, and once more
+    to write it, so that unchanged files are not written.
+
+    @return: `True` if `fname` changed
+    """
     with open(fname, 'r') as f:
-        s = f.read()
-    new_s = ''
-    n = 0
-    for c in s:
-        char = c
-        if c == '`':
-            n += 1
-        if c == '`' and n % 2 == 0:
-            char = "'"
-        new_s += char
-    print(new_s)
+        a, b = itertools.tee(f)
+        changed = any(
+            new_line != line
+            for line, new_line in zip(a, replace_backticks(b)))
+    if not changed:
+        return False
+    with open(fname, 'r') as f, file_io.atomic_open(fname) as g:
+        for line in replace_backticks(f):
+            g.write(line)
+    return True
+
+
+@contextlib.contextmanager
+def _open(fname, mode, default):
+    """Yield file `fname`, or `default` if `fname` is `None` or `-`."""
+    if fname is None or fname == '-':
+        yield default
+        return
+    with open(fname, mode) as f:
+        yield f
 
 
 def _parse_args():
-    """Return file name from command line arguments."""
+    """Return file names from command line arguments."""
     p = argparse.ArgumentParser()
     p.add_argument('-i', '--input', type=str,
-                   help='input TLA+ file')
+                   help='input TLA+ file (default: standard input)')
+    p.add_argument('-o', '--output', type=str,
+                   help='output file (default: standard output)')
+    p.add_argument('--inplace', nargs='+', type=str, metavar='PATH',
+                   help='convert these files, and the `*.tla` files '
+                        'in these directories, in place, and print '
+                        'the names of the files that changed')
     args = p.parse_args()
-    return args.input
+    inplace = args.inplace is not None
+    if inplace and (args.input or args.output):
+        p.error('`--inplace` cannot be used with `--input` or `--output`')
+    return args.input, args.output, args.inplace, inplace
 
 
 def _test():
@@ -39,5 +155,4 @@ def _test():
 
 
 if __name__ == '__main__':
-    fname = _parse_args()
-    main(fname)
+    main()